@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Measure memory allocated by scrapes of synthetic hosts.
+
+Every scrape is a collection followed by rendering of the text exposition,
+as in HTTP mode. Allocations are traced by tracemalloc, the number of
+garbage collector runs shows how many container objects the scrape creates.
+"""
+from argparse import ArgumentParser
+from gc import collect, get_stats
+from os import environ
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from tracemalloc import get_traced_memory, reset_peak
+from tracemalloc import start as start_tracemalloc
+from tracemalloc import stop as stop_tracemalloc
+
+from run import BENCHMARK_DIR, DRIVERS, create_sysfs
+from stats_parser import load_exporter
+
+
+def measure(exporter, interfaces: int, scrapes: int) -> dict[str, float]:
+    """Measure allocations of scrapes of a host.
+
+    :param exporter: Imported exporter module.
+    :param interfaces: Number of physical interfaces.
+    :param scrapes: Number of measured scrapes.
+    :return: Measured values per scrape.
+    """
+    with TemporaryDirectory() as tmp:
+        sysfs = create_sysfs(Path(tmp), interfaces, DRIVERS)
+        environ["FAKE_ETHTOOL_LOG"] = "/dev/null"
+        collector = exporter.EthtoolCollector(
+            [
+                "-f",
+                "/dev/null",
+                "-q",
+                "--sysfs-root",
+                str(sysfs),
+                "--stats-backend",
+                "ethtool",
+                "--info-backend",
+                "ethtool",
+                "--collectors",
+                "stats",
+            ]
+        )
+        collector.ethtool = str(BENCHMARK_DIR / "fake-ethtool")
+        try:
+            # Warm up caches of the exporter
+            exporter.generate_text(tuple(collector.collect()))
+            collect()
+            start_tracemalloc()
+            gc_runs = [generation["collections"] for generation in get_stats()]
+            retained = peak = 0
+            for _ in range(scrapes):
+                reset_peak()
+                before = get_traced_memory()[0]
+                families = tuple(collector.collect())
+                retained += get_traced_memory()[0] - before
+                exporter.generate_text(families)
+                peak += get_traced_memory()[1] - before
+                del families
+            gc_runs = [
+                generation["collections"] - runs
+                for generation, runs in zip(get_stats(), gc_runs)
+            ]
+            stop_tracemalloc()
+        finally:
+            collector.executor.shutdown()
+    return {
+        "retained": retained / scrapes / 2**10,
+        "peak": peak / scrapes / 2**10,
+        "gen0": gc_runs[0] / scrapes,
+        "gen2": gc_runs[2] / scrapes,
+    }
+
+
+def main():
+    """Run the measurement for all requested host sizes."""
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-n",
+        "--interfaces",
+        type=int,
+        nargs="+",
+        default=[1, 16, 64],
+        help="Numbers of physical interfaces to measure",
+    )
+    parser.add_argument(
+        "-s", "--scrapes", type=int, default=10, help="Scrapes per measurement"
+    )
+    args = parser.parse_args()
+
+    exporter = load_exporter()
+    print(
+        f"{'ifaces':>6} {'retained [KiB]':>14} {'peak [KiB]':>10} "
+        f"{'gen0 GCs':>8} {'gen2 GCs':>8}"
+    )
+    for interfaces in args.interfaces:
+        result = measure(exporter, interfaces, args.scrapes)
+        print(
+            f"{interfaces:>6} {result['retained']:>14.1f} {result['peak']:>10.1f} "
+            f"{result['gen0']:>8.1f} {result['gen2']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+/*
+ * Build the rtnetlink dump kernel_replies.py feeds through find_vfs().
+ *
+ * No SR-IOV capable NIC was at hand to record one, so the request and the
+ * replies are assembled from the uapi structs of linux/if_link.h, with the
+ * attributes rtnl_fill_vfinfo() puts for every VF. Regenerate vf.json with
+ *
+ *   gcc -o /tmp/vf vf.c && /tmp/vf > vf.json
+ */
+#include <linux/if_arp.h>
+#include <linux/if_link.h>
+#include <linux/netlink.h>
+#include <linux/rtnetlink.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <string.h>
+
+static unsigned char buffer[4096];
+static size_t length;
+
+static size_t put(const void *data, size_t size)
+{
+	size_t offset = length;
+
+	memcpy(buffer + length, data, size);
+	length += NLMSG_ALIGN(size);
+	return offset;
+}
+
+static size_t put_attr(unsigned short type, const void *data, size_t size)
+{
+	size_t offset = length;
+	struct rtattr *attr = (struct rtattr *)(buffer + offset);
+
+	attr->rta_len = RTA_LENGTH(size);
+	attr->rta_type = type;
+	if (size)
+		memcpy(RTA_DATA(attr), data, size);
+	length += RTA_SPACE(size);
+	return offset;
+}
+
+static size_t nest_start(unsigned short type)
+{
+	return put_attr(type, NULL, 0);
+}
+
+static void nest_end(size_t offset)
+{
+	((struct rtattr *)(buffer + offset))->rta_len = length - offset;
+}
+
+static size_t message_start(unsigned short type, unsigned short flags)
+{
+	struct nlmsghdr header = {
+		.nlmsg_type = type, .nlmsg_flags = flags, .nlmsg_seq = 1
+	};
+
+	return put(&header, sizeof(header));
+}
+
+static void message_end(size_t offset)
+{
+	((struct nlmsghdr *)(buffer + offset))->nlmsg_len = length - offset;
+}
+
+static void print_hex(void)
+{
+	printf("\"");
+	for (size_t i = 0; i < length; i++)
+		printf("%02x", buffer[i]);
+	printf("\"");
+	length = 0;
+}
+
+struct vf {
+	uint32_t vlan;
+	int32_t spoofchk;
+	uint32_t link_state;
+	int32_t trust;
+	uint64_t stats[IFLA_VF_STATS_MAX + 1];
+};
+
+static const struct vf vfs[] = {
+	{ 100, 1, IFLA_VF_LINK_STATE_AUTO, 0,
+	  { 11, 12, 1300, 1400, 5, 6, 0, 7, 8 } },
+	{ 0, -1, IFLA_VF_LINK_STATE_DISABLE, 1,
+	  { 1ULL << 40, 0, 1ULL << 53, 0, 0, 0, 0, 0, 3 } },
+};
+
+static const char *stat_names[] = {
+	"rx_packets", "tx_packets", "rx_bytes", "tx_bytes", "broadcast",
+	"multicast", NULL, "rx_dropped", "tx_dropped",
+};
+
+static const char *link_states[] = { "auto", "enable", "disable" };
+
+static void put_vf(uint32_t index, const struct vf *vf)
+{
+	struct ifla_vf_mac mac = { .vf = index, .mac = { 2, 0, 0, 0, 0, index + 1 } };
+	struct ifla_vf_vlan vlan = { .vf = index, .vlan = vf->vlan };
+	struct ifla_vf_tx_rate tx_rate = { .vf = index };
+	struct ifla_vf_rate rate = { .vf = index };
+	struct ifla_vf_spoofchk spoofchk = { .vf = index, .setting = vf->spoofchk };
+	struct ifla_vf_link_state link_state = {
+		.vf = index, .link_state = vf->link_state
+	};
+	struct ifla_vf_trust trust = { .vf = index, .setting = vf->trust };
+	size_t info = nest_start(IFLA_VF_INFO);
+	size_t stats;
+
+	put_attr(IFLA_VF_MAC, &mac, sizeof(mac));
+	put_attr(IFLA_VF_VLAN, &vlan, sizeof(vlan));
+	put_attr(IFLA_VF_TX_RATE, &tx_rate, sizeof(tx_rate));
+	put_attr(IFLA_VF_RATE, &rate, sizeof(rate));
+	put_attr(IFLA_VF_SPOOFCHK, &spoofchk, sizeof(spoofchk));
+	put_attr(IFLA_VF_LINK_STATE, &link_state, sizeof(link_state));
+	put_attr(IFLA_VF_TRUST, &trust, sizeof(trust));
+	stats = nest_start(IFLA_VF_STATS);
+	for (int i = 0; i <= IFLA_VF_STATS_MAX; i++) {
+		if (i == IFLA_VF_STATS_PAD)
+			put_attr(i, NULL, 0);
+		else
+			put_attr(i, &vf->stats[i], sizeof(vf->stats[i]));
+	}
+	nest_end(stats);
+	nest_end(info);
+}
+
+static void put_link(int index, const char *name, int with_vfs)
+{
+	struct ifinfomsg link = {
+		.ifi_type = ARPHRD_ETHER,
+		.ifi_index = index,
+		.ifi_flags = IFF_UP | IFF_RUNNING,
+	};
+	uint32_t num_vf = sizeof(vfs) / sizeof(vfs[0]);
+	size_t message = message_start(RTM_NEWLINK, NLM_F_MULTI);
+	size_t list;
+
+	put(&link, sizeof(link));
+	put_attr(IFLA_IFNAME, name, strlen(name) + 1);
+	if (with_vfs) {
+		put_attr(IFLA_NUM_VF, &num_vf, sizeof(num_vf));
+		list = nest_start(IFLA_VFINFO_LIST);
+		for (uint32_t i = 0; i < num_vf; i++)
+			put_vf(i, &vfs[i]);
+		nest_end(list);
+	}
+	message_end(message);
+}
+
+static void print_expected(void)
+{
+	const char *settings[] = { "off", "on" };
+
+	printf("{\"pf0\": [");
+	for (size_t i = 0; i < sizeof(vfs) / sizeof(vfs[0]); i++) {
+		const struct vf *vf = &vfs[i];
+		const char *separator = "";
+
+		printf("%s{\"vf\": %zu, \"info\": {", i ? ", " : "", i);
+		printf("\"mac\": \"02:00:00:00:00:%02zx\", ", i + 1);
+		printf("\"vlan\": \"%u\", ", vf->vlan);
+		printf("\"link_state\": \"%s\"", link_states[vf->link_state]);
+		if (vf->spoofchk >= 0)
+			printf(", \"spoofchk\": \"%s\"", settings[vf->spoofchk]);
+		if (vf->trust >= 0)
+			printf(", \"trust\": \"%s\"", settings[vf->trust]);
+		printf("}, \"stats\": {");
+		for (int j = 0; j <= IFLA_VF_STATS_MAX; j++) {
+			if (!stat_names[j])
+				continue;
+			printf("%s\"%s\": %llu", separator, stat_names[j],
+			       (unsigned long long)vf->stats[j]);
+			separator = ", ";
+		}
+		printf("}}");
+	}
+	printf("]}");
+}
+
+int main(void)
+{
+	struct ifinfomsg link = { 0 };
+	uint32_t mask = RTEXT_FILTER_VF;
+	int32_t done = 0;
+	size_t message;
+
+	printf("{\n  \"netlink\": [\n    {\n      \"protocol\": %d,\n",
+	       NETLINK_ROUTE);
+	message = message_start(RTM_GETLINK, NLM_F_REQUEST | NLM_F_DUMP);
+	put(&link, sizeof(link));
+	put_attr(IFLA_EXT_MASK, &mask, sizeof(mask));
+	message_end(message);
+	printf("      \"request\": ");
+	print_hex();
+	printf(",\n      \"replies\": [\n        ");
+	put_link(1, "eth0", 0);
+	put_link(2, "pf0", 1);
+	print_hex();
+	printf(",\n        ");
+	message = message_start(NLMSG_DONE, NLM_F_MULTI);
+	put(&done, sizeof(done));
+	message_end(message);
+	print_hex();
+	printf("\n      ]\n    }\n  ],\n  \"expected\": {\"vfs\": ");
+	print_expected();
+	printf("}\n}\n");
+	return 0;
+}
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Feed recorded kernel replies through the netlink and ioctl parsers."""
+import json
+import re
+import struct
+from argparse import ArgumentParser
+from ctypes import memmove
+from importlib.util import module_from_spec, spec_from_file_location
+from pathlib import Path
+from socket import AF_NETLINK
+from sys import exit
+
+BENCHMARK = Path(__file__).resolve().parent
+EXPORTER = BENCHMARK.parent / "ethtool-exporter.py"
+CORPUS = BENCHMARK / "corpus" / "kernel"
+
+SYSFS_DUPLEXES = {"half": "Half", "full": "Full"}
+STAT_NAME = re.compile(r"[a-z0-9_]+")
+
+
+def load_exporter():
+    """Import ethtool-exporter.py, its name is not a valid module name."""
+    spec = spec_from_file_location("ethtool_exporter", EXPORTER)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def without_seq(message: bytes) -> bytes:
+    """Clear the sequence number of a netlink request to compare it."""
+    return message[:8] + bytes(4) + message[12:]
+
+
+def with_seq(datagram: bytes, seq: bytes) -> bytes:
+    """Set the sequence number of all netlink messages of a datagram."""
+    data = bytearray(datagram)
+    offset = 0
+    while offset + 16 <= len(data):
+        length = struct.unpack_from("I", data, offset)[0]
+        data[offset + 8 : offset + 12] = seq
+        offset += (length + 3) & ~3
+    return bytes(data)
+
+
+class RecordingSocket:
+    """Netlink socket recording requests and the datagrams replying to them."""
+
+    def __init__(self, sock, protocol: int, exchanges: list[dict]):
+        self._socket = sock
+        self._protocol = protocol
+        self._exchanges = exchanges
+
+    def __getattr__(self, name: str):
+        return getattr(self._socket, name)
+
+    def send(self, data: bytes) -> int:
+        self._exchanges.append(
+            {"protocol": self._protocol, "request": data.hex(), "replies": []}
+        )
+        return self._socket.send(data)
+
+    def recv_into(self, buffer) -> int:
+        size = self._socket.recv_into(buffer)
+        self._exchanges[-1]["replies"].append(bytes(buffer[:size]).hex())
+        return size
+
+
+class ReplaySocket:
+    """Netlink socket answering requests with recorded datagrams.
+
+    Requests have to match the recorded ones except for the sequence number,
+    which is rewritten in the replies.
+    """
+
+    def __init__(self, protocol: int, exchanges: list[dict]):
+        self._exchanges = [
+            exchange for exchange in exchanges if exchange["protocol"] == protocol
+        ]
+        self._replies: list[bytes] = []
+
+    def settimeout(self, timeout):
+        pass
+
+    def bind(self, address):
+        pass
+
+    def send(self, data: bytes) -> int:
+        for index, exchange in enumerate(self._exchanges):
+            if without_seq(bytes.fromhex(exchange["request"])) == without_seq(data):
+                break
+        else:
+            raise LookupError(f"no recorded reply to netlink request {data.hex()}")
+        del self._exchanges[index]
+        self._replies = [
+            with_seq(bytes.fromhex(reply), data[8:12]) for reply in exchange["replies"]
+        ]
+        return len(data)
+
+    def recv_into(self, buffer) -> int:
+        reply = self._replies.pop(0)
+        buffer[: len(reply)] = reply
+        return len(reply)
+
+
+def patch_sockets(exporter, wrap):
+    """Make the exporter open netlink sockets through wrap."""
+    original = exporter.socket
+
+    def open_socket(family, sock_type, protocol=0):
+        if family != AF_NETLINK:
+            return original(family, sock_type, protocol)
+        return wrap(original, family, sock_type, protocol)
+
+    exporter.socket = open_socket
+
+
+def read_sysfs(interface: str, name: str) -> str:
+    """Read an attribute of the interface from sysfs."""
+    return Path(f"/sys/class/net/{interface}/{name}").read_text().strip()
+
+
+def record(exporter, interfaces: list[str], output: Path):
+    """Record the replies about veth interfaces and the values to expect."""
+    exchanges: list[dict] = []
+    patch_sockets(
+        exporter,
+        lambda original, family, sock_type, protocol: RecordingSocket(
+            original(family, sock_type, protocol), protocol, exchanges
+        ),
+    )
+    exporter.EthtoolNetlink().link_settings()
+
+    calls = []
+    ioctl = exporter.EthtoolIoctl()
+    original_ioctl = ioctl._ioctl
+
+    def recording_ioctl(interface: str, buffer):
+        request = buffer.raw.hex()
+        original_ioctl(interface, buffer)
+        calls.append(
+            {"interface": interface, "request": request, "reply": buffer.raw.hex()}
+        )
+
+    ioctl._ioctl = recording_ioctl
+    settings = {}
+    stats = {}
+    for interface in interfaces:
+        counters = ioctl.stats(interface)
+        speed = int(read_sysfs(interface, "speed"))
+        settings[interface] = {
+            "speed": f"{speed}Mb/s" if speed > 0 else "Unknown!",
+            # DUPLEX_UNKNOWN
+            "duplex": SYSFS_DUPLEXES.get(
+                read_sysfs(interface, "duplex"), "Unknown! (255)"
+            ),
+            # veth reports PORT_TP
+            "port": "Twisted Pair",
+            "link_detected": "yes" if read_sysfs(interface, "carrier") == "1" else "no",
+        }
+        # The first statistic of veth is the index of its peer
+        stats[interface] = {
+            "count": len(counters),
+            "peer_ifindex": int(read_sysfs(interface, "iflink")),
+        }
+    recording = {
+        "netlink": exchanges,
+        "ioctl": calls,
+        "expected": {"link_settings": settings, "stats": stats},
+    }
+    output.write_text(json.dumps(recording, indent=2) + "\n")
+
+
+def check(name: str, expected, actual) -> bool:
+    """Print the result of a single check."""
+    if expected == actual:
+        print(f"ok   {name}")
+        return True
+    print(f"FAIL {name}\n     expected {expected}\n     got      {actual}")
+    return False
+
+
+def replay(exporter, recording: dict) -> bool:
+    """Feed the recorded replies through the parsers and compare the results."""
+    exchanges = recording["netlink"]
+    expected = recording["expected"]
+    patch_sockets(
+        exporter,
+        lambda original, family, sock_type, protocol: ReplaySocket(protocol, exchanges),
+    )
+    passed = True
+    if "link_settings" in expected:
+        settings = exporter.EthtoolNetlink().link_settings()
+        for interface, values in expected["link_settings"].items():
+            passed &= check(
+                f"link_settings {interface}", values, settings.get(interface)
+            )
+
+    if "stats" in expected:
+        calls = recording["ioctl"]
+        ioctl = exporter.EthtoolIoctl()
+
+        def replaying_ioctl(interface: str, buffer):
+            for call in calls:
+                if call["interface"] == interface and call["request"] == (
+                    buffer.raw.hex()
+                ):
+                    reply = bytes.fromhex(call["reply"])
+                    memmove(buffer, reply, len(reply))
+                    return
+            raise LookupError(f"no recorded reply to ioctl {buffer.raw[:12].hex()}")
+
+        ioctl._ioctl = replaying_ioctl
+        for interface, values in expected["stats"].items():
+            counters = ioctl.stats(interface)
+            passed &= check(f"stats count {interface}", values["count"], len(counters))
+            passed &= check(
+                f"stats names {interface}",
+                [],
+                [name for name, _ in counters if not STAT_NAME.fullmatch(name)],
+            )
+            passed &= check(
+                f"stats peer_ifindex {interface}",
+                values["peer_ifindex"],
+                dict(counters).get("peer_ifindex"),
+            )
+
+    if "vfs" in expected:
+        vfs = exporter.find_vfs(exporter.Netlink(exporter.NETLINK_ROUTE))
+        for interface, values in expected["vfs"].items():
+            passed &= check(
+                f"vfs {interface}",
+                values,
+                [
+                    {"vf": vf.vf, "info": vf.info, "stats": dict(vf.stats)}
+                    for vf in vfs.get(interface, [])
+                ],
+            )
+    return passed
+
+
+def main():
+    """Check all recordings or record a new one."""
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-r",
+        "--record",
+        metavar="VETH",
+        nargs="+",
+        help="record replies about these veth interfaces instead of checking",
+    )
+    parser.add_argument(
+        "-o", "--output", type=Path, default=CORPUS / "veth.json", help="recording"
+    )
+    args = parser.parse_args()
+
+    if args.record:
+        record(load_exporter(), args.record, args.output)
+        return
+    passed = True
+    for path in sorted(CORPUS.glob("*.json")):
+        print(f"# {path.name}")
+        # Every recording gets a fresh module with its own sockets patched
+        try:
+            passed &= replay(load_exporter(), json.loads(path.read_text()))
+        except LookupError as e:
+            # The request differs from the recorded one
+            print(f"FAIL {e}")
+            passed = False
+    exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""Measure collect() latency on synthetic hosts without real NICs.
+
+Every run creates a fake sysfs tree with the requested number of physical
+interfaces (plus the same number of virtual ones, which have to be filtered
+out) and points the exporter at fake-ethtool, which replays outputs of the
+corpus. Arguments after -- are passed to the exporter.
+"""
+from argparse import REMAINDER, ArgumentParser
+from os import environ
+from pathlib import Path
+from resource import RUSAGE_SELF, getrusage
+from statistics import median, quantiles
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from tracemalloc import get_traced_memory
+from tracemalloc import start as start_tracemalloc
+from tracemalloc import stop as stop_tracemalloc
+
+from stats_parser import load_exporter
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+DATA_PREFIX = "node_net_ethtool"
+DRIVERS = ("mlx5", "ice", "i40e", "bnxt", "ixgbe")
+MODULES = ("sfp", "qsfp", "none")
+
+
+def create_sysfs(root: Path, interfaces: int, drivers: tuple[str, ...]) -> Path:
+    """Create fake /sys/class/net with physical and virtual interfaces.
+
+    :param root: Directory to create the tree in.
+    :param interfaces: Number of physical interfaces.
+    :param drivers: Drivers to cycle through for the physical interfaces.
+    :return: Path to be used as --sysfs-root.
+    """
+    sysfs = root / "sys"
+    class_net = sysfs / "class" / "net"
+    class_net.mkdir(parents=True)
+    for index in range(interfaces):
+        driver = drivers[index % len(drivers)]
+        module = MODULES[index // len(drivers) % len(MODULES)]
+        physical = f"{driver}-{module}-{index}"
+        device = f"devices/pci0000:00/0000:{index // 32:02x}:{index % 32:02x}.0"
+        for name, path in (
+            (physical, f"{device}/net/{physical}"),
+            (f"veth{index}", f"devices/virtual/net/veth{index}"),
+        ):
+            (sysfs / path).mkdir(parents=True)
+            (class_net / name).symlink_to(f"../../{path}")
+    return sysfs
+
+
+def run(exporter, interfaces: int, args) -> dict[str, float]:
+    """Benchmark collect() of a host with the given number of interfaces.
+
+    :param exporter: Imported exporter module.
+    :param interfaces: Number of physical interfaces.
+    :param args: Parsed arguments of the benchmark.
+    :return: Measured values.
+    """
+    with TemporaryDirectory() as tmp:
+        sysfs = create_sysfs(Path(tmp), interfaces, tuple(args.drivers))
+        log = Path(tmp, "ethtool.log")
+        environ["FAKE_ETHTOOL_LOG"] = str(log)
+        collector = exporter.EthtoolCollector(
+            [
+                "-f",
+                "/dev/null",
+                "-q",
+                "--sysfs-root",
+                str(sysfs),
+                "--stats-backend",
+                "ethtool",
+                "--info-backend",
+                "ethtool",
+                *args.exporter_args,
+            ]
+        )
+        collector.ethtool = str(BENCHMARK_DIR / "fake-ethtool")
+        try:
+            # Warm up caches of the exporter
+            list(collector.collect())
+            log.write_text("")
+            durations = []
+            for _ in range(args.iterations):
+                started = perf_counter()
+                list(collector.collect())
+                durations.append(perf_counter() - started)
+            subprocesses = len(log.read_text().splitlines()) / args.iterations
+
+            start_tracemalloc()
+            list(collector.collect())
+            peak = get_traced_memory()[1]
+            stop_tracemalloc()
+
+            families = [
+                family
+                for family in collector.collect()
+                if family.name.startswith(DATA_PREFIX)
+            ]
+            series = sum(1 for family in families for _ in family.samples)
+            output = len(exporter.generate_text(families))
+        finally:
+            collector.executor.shutdown()
+    return {
+        "p50": median(durations) * 1e3,
+        "p99": quantiles(durations, n=100)[98] * 1e3,
+        "subprocesses": subprocesses,
+        "peak": peak / 2**20,
+        "maxrss": getrusage(RUSAGE_SELF).ru_maxrss / 2**10,
+        "series": series,
+        "output": output / 2**10,
+    }
+
+
+def main():
+    """Run the benchmark for all requested host sizes."""
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-n",
+        "--interfaces",
+        type=int,
+        nargs="+",
+        default=[1, 4, 16, 64, 256],
+        help="Numbers of physical interfaces to benchmark",
+    )
+    parser.add_argument(
+        "-i", "--iterations", type=int, default=20, help="Collections per run"
+    )
+    parser.add_argument(
+        "-d",
+        "--drivers",
+        nargs="+",
+        choices=DRIVERS,
+        default=list(DRIVERS),
+        help="Drivers of the physical interfaces",
+    )
+    parser.add_argument("exporter_args", nargs=REMAINDER)
+    args = parser.parse_args()
+    if args.exporter_args[:1] == ["--"]:
+        args.exporter_args = args.exporter_args[1:]
+    if args.iterations < 2:
+        parser.error("At least 2 iterations are needed")
+
+    exporter = load_exporter()
+    print(
+        f"{'ifaces':>6} {'p50 [ms]':>9} {'p99 [ms]':>9} {'forks':>7} "
+        f"{'peak [MiB]':>10} {'maxrss [MiB]':>12} {'series':>7} {'output [KiB]':>12}"
+    )
+    for interfaces in args.interfaces:
+        result = run(exporter, interfaces, args)
+        print(
+            f"{interfaces:>6} {result['p50']:>9.1f} {result['p99']:>9.1f} "
+            f"{result['subprocesses']:>7.0f} {result['peak']:>10.2f} "
+            f"{result['maxrss']:>12.1f} {result['series']:>7} "
+            f"{result['output']:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
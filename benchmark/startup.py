@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Measure wall-clock time and peak RSS of oneshot textfile runs.
+
+The exporter runs as a new process writing a textfile once, like it does
+from cron or a systemd timer, against a synthetic host with fake-ethtool.
+Apart from the sysfs root, it runs with default arguments. Exporters older
+than --sysfs-root read /sys/class/net, so the synthetic tree is bind mounted
+there in a private mount namespace for them, which needs root.
+"""
+from argparse import ArgumentParser
+from os import environ, wait4
+from pathlib import Path
+from statistics import median
+from subprocess import Popen
+from sys import executable
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from run import BENCHMARK_DIR, DRIVERS, create_sysfs
+
+EXPORTER = BENCHMARK_DIR.parent / "ethtool-exporter.py"
+
+
+def exporter_command(exporter: Path, sysfs: Path, textfile: Path) -> list[str]:
+    """Build the command running the exporter once on the synthetic host.
+
+    :param exporter: Path to the exporter script.
+    :param sysfs: Root of the synthetic sysfs tree.
+    :param textfile: Path of the textfile to write.
+    :return: Command to run.
+    """
+    command = [executable, str(exporter), "-f", str(textfile), "-1", "-q"]
+    if "--sysfs-root" in exporter.read_text():
+        return [*command, "--sysfs-root", str(sysfs)]
+    return [
+        "unshare",
+        "--mount",
+        "--propagation",
+        "private",
+        "sh",
+        "-c",
+        'mount --bind "$0" /sys/class/net && exec "$@"',
+        str(sysfs / "class" / "net"),
+        *command,
+    ]
+
+
+def measure(exporter: Path, interfaces: int, runs: int) -> dict[str, float]:
+    """Run the exporter in oneshot mode repeatedly.
+
+    :param exporter: Path to the exporter script.
+    :param interfaces: Number of physical interfaces.
+    :param runs: Number of runs.
+    :return: Median wall-clock time and peak RSS of the runs.
+    """
+    with TemporaryDirectory() as tmp:
+        sysfs = create_sysfs(Path(tmp), interfaces, DRIVERS)
+        bin_dir = Path(tmp, "bin")
+        bin_dir.mkdir()
+        (bin_dir / "ethtool").symlink_to(BENCHMARK_DIR / "fake-ethtool")
+        env = dict(environ, PATH=f"{bin_dir}:{environ.get('PATH', '')}")
+        # fake-ethtool looks for the corpus next to the symlink otherwise
+        env["FAKE_ETHTOOL_CORPUS"] = str(BENCHMARK_DIR / "corpus")
+        env["FAKE_ETHTOOL_LOG"] = str(Path(tmp, "ethtool.log"))
+        command = exporter_command(exporter, sysfs, Path(tmp, "ethtool.prom"))
+        durations = []
+        rss = []
+        for _ in range(runs):
+            started = perf_counter()
+            process = Popen(command, env=env)
+            _, status, usage = wait4(process.pid, 0)
+            durations.append(perf_counter() - started)
+            if status:
+                raise RuntimeError(f"exporter failed with status {status}")
+            rss.append(usage.ru_maxrss)
+        # Failing ethtool runs are quick, make sure the runs collected data
+        text = Path(tmp, "ethtool.prom").read_text()
+        if missing := [
+            file.name
+            for file in (sysfs / "class" / "net").iterdir()
+            if not file.name.startswith("veth") and f'device="{file.name}"' not in text
+        ]:
+            raise RuntimeError(f"no data of {', '.join(missing)} in the textfile")
+    return {"wall": median(durations) * 1e3, "rss": max(rss) / 2**10}
+
+
+def main():
+    """Run the measurement for all requested host sizes."""
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-n",
+        "--interfaces",
+        type=int,
+        nargs="+",
+        default=[1, 16],
+        help="Numbers of physical interfaces to measure",
+    )
+    parser.add_argument("-r", "--runs", type=int, default=10, help="Runs per size")
+    parser.add_argument(
+        "-e",
+        "--exporter",
+        type=Path,
+        default=EXPORTER,
+        help="Exporter script to measure, e.g. an older version",
+    )
+    args = parser.parse_args()
+
+    print(f"{'ifaces':>6} {'wall [ms]':>9} {'peak RSS [MiB]':>14}")
+    for interfaces in args.interfaces:
+        result = measure(args.exporter, interfaces, args.runs)
+        print(f"{interfaces:>6} {result['wall']:>9.1f} {result['rss']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Compare the bytes-level `ethtool -S` parser with the original str one."""
+from argparse import ArgumentParser
+from importlib.util import module_from_spec, spec_from_file_location
+from pathlib import Path
+from timeit import repeat
+
+EXPORTER = Path(__file__).resolve().parent.parent / "ethtool-exporter.py"
+
+# Per-queue and per-port statistics as reported by mlx5
+QUEUE_STATS = (
+    "packets",
+    "bytes",
+    "csum_complete",
+    "csum_unnecessary",
+    "csum_none",
+    "xdp_drop",
+    "xdp_redirect",
+    "lro_packets",
+    "lro_bytes",
+    "removed_vlan_packets",
+    "wqe_err",
+    "mpwqe_filler_cqes",
+    "buff_alloc_err",
+    "cqe_compress_blks",
+    "cqe_compress_pkts",
+    "cache_reuse",
+    "cache_full",
+    "cache_empty",
+    "cache_busy",
+    "congst_umr",
+)
+
+
+def load_exporter():
+    """Import ethtool-exporter.py, its name is not a valid module name."""
+    spec = spec_from_file_location("ethtool_exporter", EXPORTER)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def ethtool_output(lines: int) -> bytes:
+    """Generate `ethtool -S` output of an mlx5 port with lines statistics."""
+    output = ["NIC statistics:"]
+    queue = 0
+    while len(output) <= lines:
+        for name in QUEUE_STATS:
+            prefix = "rx" if queue % 2 else "tx"
+            output.append(f"     {prefix}{queue // 2}_{name}: {queue * 7919 + 17}")
+        queue += 1
+    return ("\n".join(output[: lines + 1]) + "\n").encode()
+
+
+def legacy_parse(collector, data: bytes) -> list[tuple[str, float]]:
+    """The parser used before the bytes-level one, kept for comparison."""
+    stats = []
+    for line in data.decode("utf-8").splitlines():
+        line = line.strip()
+        if not line or line == "NIC statistics:":
+            continue
+        try:
+            if not (key_val := collector._parse_key_value_line(line)):
+                continue
+            key, value = key_val
+            stats.append((key.strip(), float(value.strip())))
+        except ValueError:
+            continue
+    return stats
+
+
+def main():
+    """Run the comparison and print the results."""
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--number", type=int, default=200)
+    parser.add_argument("-l", "--lines", type=int, nargs="+", default=[2000, 10000])
+    args = parser.parse_args()
+
+    exporter = load_exporter()
+    collector = exporter.EthtoolCollector(
+        ["-f", "/dev/null", "--stats-backend", "ethtool", "-q"]
+    )
+    print(f"{'lines':>6} {'legacy [us]':>12} {'bytes [us]':>12} {'speedup':>8}")
+    for lines in args.lines:
+        data = ethtool_output(lines)
+        assert list(collector._parse_ethtool_stats("eth0", data)) == legacy_parse(
+            collector, data
+        )
+        results = []
+        for parse in (
+            lambda: legacy_parse(collector, data),
+            lambda: list(collector._parse_ethtool_stats("eth0", data)),
+        ):
+            results.append(min(repeat(parse, number=args.number, repeat=5)))
+        legacy, current = (result / args.number * 1e6 for result in results)
+        print(f"{lines:>6} {legacy:>12.1f} {current:>12.1f} {legacy / current:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
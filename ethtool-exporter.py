@@ -1,25 +1,1551 @@
 #!/usr/bin/env python3
 """Collect ethtool metrics,publish them via http or save them to a file."""
 import re
-from argparse import ArgumentParser, Namespace
-from distutils.spawn import find_executable
+import struct
+from array import array
+from argparse import ArgumentParser, ArgumentTypeError, Namespace
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from ctypes import CDLL, Array, addressof, create_string_buffer, get_errno
+from dataclasses import dataclass, field
+from fcntl import ioctl
+from gzip import compress
 from logging import CRITICAL, DEBUG, INFO, Logger, basicConfig, getLogger
-from os import environ
+from math import isinf, isnan
+from os import environ, getpid, replace, stat
 from pathlib import Path
-from subprocess import PIPE, Popen
-from sys import argv, exit
-from time import sleep
-from typing import Iterator, Optional, Union
+from shutil import which
+from socket import (
+    AF_INET,
+    AF_NETLINK,
+    SOCK_DGRAM,
+    SOCK_RAW,
+    getaddrinfo,
+    gethostname,
+    socket,
+)
+from subprocess import PIPE, Popen, TimeoutExpired
+from sys import argv, exit, intern
+from threading import Event, Lock, Thread
+from time import monotonic, sleep, time
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional, Sequence, Union
+from urllib.parse import parse_qs, urlsplit
+from zlib import crc32
 
-from prometheus_client import CollectorRegistry, start_http_server, write_to_textfile
-from prometheus_client.core import GaugeMetricFamily, InfoMetricFamily
+# Names of the collectors, one per exported metric family
+COLLECTORS = (
+    "info",
+    "xcvr_info",
+    "xcvr_sensors",
+    "xcvr_alarms",
+    "stats",
+    "vf",
+    "link",
+)
+COLLECTOR_ALIASES = {"xcvr": ("xcvr_info", "xcvr_sensors", "xcvr_alarms")}
+XCVR_COLLECTORS = frozenset(COLLECTOR_ALIASES["xcvr"])
+
+# Rules recognizing per-queue statistics. The queue group is the queue number,
+# the type group, if present, the statistic name without the queue. Otherwise
+# the name is the whole key with the queue number left out.
+QUEUE_RULES = (
+    # mlx5, virtio_net: rx0_packets, tx12_bytes, ch3_events
+    r"^(?:rx|tx|ch)(?P<queue>\d+)_",
+    # ice, ixgbe, ifb: rx_queue_0_packets, tx_queue_12_bytes
+    r"^(?:rx|tx)_queue_(?P<queue>\d+)_",
+    # i40e: rx-0.rx_packets, tx-12.tx_bytes
+    r"^(?:rx|tx)-(?P<queue>\d+)\.(?P<type>.+)$",
+    # bnxt: [0]: rx_ucast_packets
+    r"^\[(?P<queue>\d+)\]: (?P<type>.+)$",
+)
+
+# Content types of the rendered expositions
+TEXT_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Names of ethtool invocations used in metrics about the exporter itself
+ETHTOOL_COMMANDS = {"-S": "stats", "": "info", "-m": "xcvr"}
+SAMPLED_RATE_QUANTILES = (0.5, 0.9, 0.99)
+# Default number of seconds after which ethtool invocations are killed
+COMMAND_TIMEOUTS = {"stats": 5.0, "info": 5.0, "xcvr": 10.0}
+BREAKER_STATES = ("closed", "open", "half_open")
+# Number of seconds to wait for ethtool to exit after it has been killed
+KILL_TIMEOUT = 1.0
+COMMAND_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Collectors and devices selected by a scrape, None for all
+Scope = tuple[Optional[frozenset[str]], Optional[frozenset[str]]]
+FULL_SCOPE: Scope = (None, None)
+
+# Constants from linux/sockios.h, linux/if.h and linux/ethtool.h
+SIOCETHTOOL = 0x8946
+IFNAMSIZ = 16
+ETHTOOL_GSTRINGS = 0x1B
+ETHTOOL_GSTATS = 0x1D
+ETHTOOL_GSSET_INFO = 0x37
+ETH_SS_STATS = 1
+ETH_GSTRING_LEN = 32
+
+# Constants from linux/netlink.h and linux/genetlink.h
+NETLINK_GENERIC = 16
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLA_F_NESTED = 0x8000
+NLA_TYPE_MASK = 0x3FFF
+GENL_ID_CTRL = 0x10
+CTRL_CMD_GETFAMILY = 3
+CTRL_ATTR_FAMILY_ID = 1
+CTRL_ATTR_FAMILY_NAME = 2
+
+# Constants from linux/rtnetlink.h and linux/if_link.h
+NETLINK_ROUTE = 0
+RTMGRP_LINK = 0x1
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+IFF_LOWER_UP = 0x10000
+IFLA_IFNAME = 3
+IFLA_LINKINFO = 18
+IFLA_VFINFO_LIST = 22
+IFLA_EXT_MASK = 29
+IFLA_VF_INFO = 1
+IFLA_VF_MAC = 1
+IFLA_VF_VLAN = 2
+IFLA_VF_SPOOFCHK = 4
+IFLA_VF_LINK_STATE = 5
+IFLA_VF_STATS = 8
+IFLA_VF_TRUST = 9
+RTEXT_FILTER_VF = 1
+ARPHRD_ETHER = 1
+# Names of IFLA_VF_STATS_* attributes, None for padding
+VF_STATS = (
+    "rx_packets",
+    "tx_packets",
+    "rx_bytes",
+    "tx_bytes",
+    "broadcast",
+    "multicast",
+    None,
+    "rx_dropped",
+    "tx_dropped",
+)
+VF_LINK_STATES = ("auto", "enable", "disable")
+
+# Constant from linux/sched.h
+CLONE_NEWNET = 0x40000000
+
+# Constants from linux/ethtool_netlink.h
+ETHTOOL_GENL_NAME = "ethtool"
+ETHTOOL_GENL_VERSION = 1
+ETHTOOL_MSG_LINKINFO_GET = 2
+ETHTOOL_MSG_LINKMODES_GET = 4
+ETHTOOL_MSG_LINKSTATE_GET = 6
+ETHTOOL_A_HEADER_DEV_NAME = 2
+ETHTOOL_A_HEADER_FLAGS = 3
+ETHTOOL_FLAG_COMPACT_BITSETS = 1 << 0
+# The request/reply header is attribute 1 of every message
+ETHTOOL_A_HEADER = 1
+ETHTOOL_A_LINKINFO_PORT = 2
+ETHTOOL_A_LINKMODES_SPEED = 5
+ETHTOOL_A_LINKMODES_DUPLEX = 6
+ETHTOOL_A_LINKSTATE_LINK = 2
+SPEED_UNKNOWN = 0xFFFFFFFF
+# Names ethtool uses for port types and duplex modes in its output
+ETHTOOL_PORTS = {
+    0x00: "Twisted Pair",
+    0x01: "AUI",
+    0x02: "MII",
+    0x03: "FIBRE",
+    0x04: "BNC",
+    0x05: "Direct Attach Copper",
+    0xEF: "None",
+    0xFF: "Other",
+}
+ETHTOOL_DUPLEXES = {0x00: "Half", 0x01: "Full"}
+
+
+class Sample(NamedTuple):
+    """Sample of a metric, compatible with samples of prometheus_client."""
+
+    name: str
+    labels: dict[str, str]
+    value: float
+    timestamp: Optional[float] = None
+    exemplar: None = None
+    native_histogram: None = None
+
+
+class Metric:
+    """Metric family with samples, compatible with families of prometheus_client.
+
+    Importing prometheus_client takes longer than a whole oneshot run, so
+    families are built with these classes, which have the same interface,
+    and rendered by generate_text and generate_openmetrics.
+    """
+
+    def __init__(self, name: str, documentation: str, typ: str, unit: str = ""):
+        """Construct the object with no samples.
+
+        :param name: Name of the metric family.
+        :param documentation: Help text of the family.
+        :param typ: Type of the family, e.g. gauge.
+        :param unit: Unit of the family.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.type = typ
+        self.unit = unit
+        self.samples: list[Sample] = []
+        self._labelnames: tuple[str, ...] = ()
+
+
+class GaugeMetricFamily(Metric):
+    """Gauge metric family."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        value: Optional[float] = None,
+        labels: Optional[Sequence[str]] = None,
+    ):
+        """Construct the object.
+
+        :param name: Name of the metric family.
+        :param documentation: Help text of the family.
+        :param value: Value of the only sample of a family without labels.
+        :param labels: Names of the labels.
+        """
+        super().__init__(name, documentation, "gauge")
+        self._labelnames = tuple(labels or ())
+        if value is not None:
+            self.add_metric([], value)
+
+    def add_metric(self, labels: Sequence[str], value: float):
+        """Add a sample.
+
+        :param labels: Values of the labels.
+        :param value: Value of the sample.
+        """
+        self.samples.append(
+            Sample(self.name, dict(zip(self._labelnames, labels)), value)
+        )
+
+
+class CounterMetricFamily(GaugeMetricFamily):
+    """Counter metric family, its samples have the _total suffix."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        value: Optional[float] = None,
+        labels: Optional[Sequence[str]] = None,
+    ):
+        """Construct the object.
+
+        :param name: Name of the metric family, without the _total suffix.
+        :param documentation: Help text of the family.
+        :param value: Value of the only sample of a family without labels.
+        :param labels: Names of the labels.
+        """
+        super().__init__(name, documentation, value, labels)
+        self.type = "counter"
+
+    def add_metric(self, labels: Sequence[str], value: float):
+        """Add a sample.
+
+        :param labels: Values of the labels.
+        :param value: Value of the sample.
+        """
+        self.samples.append(
+            Sample(f"{self.name}_total", dict(zip(self._labelnames, labels)), value)
+        )
+
+
+class InfoMetricFamily(Metric):
+    """Info metric family, its samples have the _info suffix and value 1."""
+
+    def __init__(
+        self, name: str, documentation: str, labels: Optional[Sequence[str]] = None
+    ):
+        """Construct the object.
+
+        :param name: Name of the metric family, without the _info suffix.
+        :param documentation: Help text of the family.
+        :param labels: Names of the labels identifying the samples.
+        """
+        super().__init__(name, documentation, "info")
+        self._labelnames = tuple(labels or ())
+
+    def add_metric(self, labels: Iterable[str], value: dict[str, str]):
+        """Add a sample.
+
+        :param labels: Values of the labels identifying the sample.
+        :param value: Other labels of the sample.
+        """
+        sample_labels = dict(zip(self._labelnames, labels))
+        sample_labels.update(value)
+        self.samples.append(Sample(f"{self.name}_info", sample_labels, 1.0))
+
+
+class HistogramMetricFamily(Metric):
+    """Histogram metric family."""
+
+    def __init__(
+        self, name: str, documentation: str, labels: Optional[Sequence[str]] = None
+    ):
+        """Construct the object.
+
+        :param name: Name of the metric family.
+        :param documentation: Help text of the family.
+        :param labels: Names of the labels.
+        """
+        super().__init__(name, documentation, "histogram")
+        self._labelnames = tuple(labels or ())
+
+    def add_metric(
+        self, labels: Sequence[str], buckets: list[tuple[str, float]], sum_value: float
+    ):
+        """Add a histogram.
+
+        :param labels: Values of the labels.
+        :param buckets: Upper bounds and cumulative counts, ending with +Inf.
+        :param sum_value: Sum of the observed values.
+        """
+        sample_labels = dict(zip(self._labelnames, labels))
+        for bound, count in buckets:
+            self.samples.append(
+                Sample(f"{self.name}_bucket", {**sample_labels, "le": bound}, count)
+            )
+        self.samples.append(Sample(f"{self.name}_count", sample_labels, buckets[-1][1]))
+        self.samples.append(Sample(f"{self.name}_sum", sample_labels, sum_value))
+
+
+MetricFamily = Union[Metric, "StoredFamily"]
+MetricFamilies = dict[str, MetricFamily]
+
+
+def format_value(value: float) -> str:
+    """Format a value the way Prometheus does.
+
+    :param value: Value of a sample.
+    :return: Formatted value.
+    """
+    if isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if isnan(value):
+        return "NaN"
+    text = repr(float(value))
+    dot = text.find(".")
+    # Go switches to exponents sooner than Python
+    if value > 0 and dot > 6:
+        mantissa = f"{text[0]}.{text[1:dot]}{text[dot + 1:]}".rstrip("0.")
+        return f"{mantissa}e+{dot - 1:02d}"
+    return text
+
+
+def escape_label_value(value: str) -> str:
+    """Escape a label value for the text format.
+
+    :param value: Value of a label.
+    :return: Escaped value.
+    """
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _render_samples(output: list[str], samples: Iterable[Sample]):
+    """Render samples of a family, which look the same in both formats.
+
+    :param output: List the rendered lines are appended to.
+    :param samples: Samples to render.
+    """
+    for sample in samples:
+        if sample.labels:
+            labels = ",".join(
+                f'{key}="{escape_label_value(value)}"'
+                for key, value in sorted(sample.labels.items())
+            )
+            output.append(f"{sample.name}{{{labels}}} {format_value(sample.value)}\n")
+        else:
+            output.append(f"{sample.name} {format_value(sample.value)}\n")
+
+
+def generate_text(families: Iterable[MetricFamily]) -> bytes:
+    """Render metric families in the Prometheus text format.
+
+    The output is the same as generate_latest of prometheus_client gives.
+
+    :param families: Metric families to render.
+    :return: Rendered families.
+    """
+    output: list[str] = []
+    for family in families:
+        name = family.name
+        typ = family.type
+        if typ == "counter":
+            name = f"{name}_total"
+        elif typ == "info":
+            name = f"{name}_info"
+            typ = "gauge"
+        documentation = family.documentation.replace("\\", r"\\").replace("\n", r"\n")
+        output.append(f"# HELP {name} {documentation}\n# TYPE {name} {typ}\n")
+        _render_samples(output, family.samples)
+    return "".join(output).encode("utf-8")
+
+
+def generate_openmetrics(families: Iterable[MetricFamily]) -> bytes:
+    """Render metric families in the OpenMetrics text format.
+
+    The output is the same as generate_latest of
+    prometheus_client.openmetrics.exposition gives.
+
+    :param families: Metric families to render.
+    :return: Rendered families, including the final # EOF line.
+    """
+    output: list[str] = []
+    for family in families:
+        name = family.name
+        documentation = escape_label_value(family.documentation)
+        output.append(f"# HELP {name} {documentation}\n# TYPE {name} {family.type}\n")
+        if family.unit:
+            output.append(f"# UNIT {name} {family.unit}\n")
+        _render_samples(output, family.samples)
+    output.append("# EOF\n")
+    return "".join(output).encode("utf-8")
+
+
+def write_textfile(path: str, families: Iterable[MetricFamily]):
+    """Write metric families to a file atomically.
+
+    The text is written to a temporary file next to the target, which then
+    replaces it, so node_exporter never reads a partially written file.
+
+    :param path: Path of the textfile.
+    :param families: Metric families to write.
+    """
+    data = generate_text(families)
+    tmp_path = f"{path}.{getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+        replace(tmp_path, path)
+    except OSError:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+class EthtoolIoctl:
+    """Read NIC statistics in-process using the SIOCETHTOOL ioctl.
+
+    This is what `ethtool -S` does under the hood, minus the fork and
+    the text round-trip. Names of the statistics are cached per interface
+    and only re-read when the driver reports a different number of them.
+    """
+
+    def __init__(self):
+        """Open the socket used for the ioctl calls."""
+        self._socket = socket(AF_INET, SOCK_DGRAM)
+        self._strings: dict[str, tuple[str, ...]] = {}
+        self._buffers: dict[str, Array] = {}
+
+    def _ioctl(self, interface: str, buffer) -> None:
+        """Run SIOCETHTOOL with the ethtool command stored in buffer.
+
+        :param interface: Interface the command is run for.
+        :param buffer: Ctypes buffer holding the ethtool command structure.
+        The kernel writes the reply into the same buffer.
+        """
+        # struct ifreq is the interface name followed by a union, where we
+        # use ifr_data pointing to the ethtool command structure.
+        ifreq = bytearray(40)
+        struct.pack_into(
+            f"{IFNAMSIZ}sP", ifreq, 0, interface.encode(), addressof(buffer)
+        )
+        ioctl(self._socket.fileno(), SIOCETHTOOL, ifreq)
+
+    def stats_count(self, interface: str) -> int:
+        """Get the number of statistics the driver exports for interface.
+
+        :param interface: Interface we want to count statistics for.
+        :return: Number of statistics, 0 if the driver has none.
+        """
+        # struct ethtool_sset_info with space for a single data element
+        buffer = create_string_buffer(
+            struct.pack("IIQI", ETHTOOL_GSSET_INFO, 0, 1 << ETH_SS_STATS, 0)
+        )
+        self._ioctl(interface, buffer)
+        _, _, sset_mask, count = struct.unpack_from("IIQI", buffer)
+        if not sset_mask & (1 << ETH_SS_STATS):
+            return 0
+        return count
+
+    def stats_strings(self, interface: str, count: int) -> tuple[str, ...]:
+        """Get names of the statistics for interface.
+
+        :param interface: Interface we want the names for.
+        :param count: Number of statistics as reported by stats_count.
+        :return: Names of the statistics in the order the driver reports them.
+        """
+        buffer = create_string_buffer(12 + count * ETH_GSTRING_LEN)
+        struct.pack_into("III", buffer, 0, ETHTOOL_GSTRINGS, ETH_SS_STATS, count)
+        self._ioctl(interface, buffer)
+        data = buffer.raw[12:]
+        return tuple(
+            data[i : i + ETH_GSTRING_LEN].split(b"\0", 1)[0].decode().strip()
+            for i in range(0, count * ETH_GSTRING_LEN, ETH_GSTRING_LEN)
+        )
+
+    def read(self, interface: str) -> tuple[tuple[str, ...], memoryview]:
+        """Read all statistics of interface with a single ETHTOOL_GSTATS call.
+
+        :param interface: Interface we want the statistics for.
+        :return: Names of the statistics and a view of their u64 values, valid
+        until the next read of the interface.
+        :raises OSError: When the driver does not support the ioctl.
+        """
+        count = self.stats_count(interface)
+        strings = self._strings.get(interface)
+        if strings is None or len(strings) != count:
+            strings = self.stats_strings(interface, count)
+            self._strings[interface] = strings
+        if not count:
+            return strings, memoryview(b"").cast("Q")
+        # The kernel writes as many values as the driver has at the moment
+        # of the call, so leave some room for a driver growing its list.
+        buffer = self._buffers.get(interface)
+        if buffer is None or len(buffer) < 8 + (count + 64) * 8:
+            buffer = self._buffers[interface] = create_string_buffer(
+                8 + (count + 64) * 8
+            )
+        struct.pack_into("II", buffer, 0, ETHTOOL_GSTATS, count)
+        self._ioctl(interface, buffer)
+        _, n_stats = struct.unpack_from("II", buffer)
+        if n_stats != count:
+            # Statistics changed under our hands, read the names next time.
+            self._strings.pop(interface, None)
+            raise OSError(f"number of statistics of {interface} changed")
+        return strings, memoryview(buffer).cast("B")[8 : 8 + count * 8].cast("Q")
+
+    def stats(self, interface: str) -> list[tuple[str, float]]:
+        """Read all statistics of interface.
+
+        :param interface: Interface we want the statistics for.
+        :return: Pairs of statistic name and value.
+        :raises OSError: When the driver does not support the ioctl.
+        """
+        strings, values = self.read(interface)
+        return list(zip(strings, map(float, values)))
+
+
+class Netlink:
+    """Minimal netlink client able to run requests and dumps."""
+
+    def __init__(self, protocol: int, groups: int = 0, timeout: Optional[float] = None):
+        """Open and bind the netlink socket.
+
+        :param protocol: Netlink protocol (family) to talk to.
+        :param groups: Bitmask of multicast groups to subscribe to.
+        :param timeout: Number of seconds to wait for a reply, None for ever.
+        """
+        self._socket = socket(AF_NETLINK, SOCK_RAW, protocol)
+        self._socket.settimeout(timeout)
+        self._socket.bind((0, groups))
+        self._buffer = bytearray(1 << 20)
+        self._lock = Lock()
+        self._seq = 0
+
+    @staticmethod
+    def attr(attr_type: int, data: bytes) -> bytes:
+        """Pack a netlink attribute including the alignment padding.
+
+        :param attr_type: Type of the attribute.
+        :param data: Payload of the attribute.
+        :return: Packed attribute.
+        """
+        length = 4 + len(data)
+        return struct.pack("HH", length, attr_type) + data + bytes(-length % 4)
+
+    @staticmethod
+    def iter_attrs(data: bytes) -> Iterator[tuple[int, bytes]]:
+        """Parse a stream of netlink attributes, which may repeat.
+
+        :param data: Attributes as sent by the kernel.
+        :return: Types and payloads of the attributes.
+        """
+        offset = 0
+        while offset + 4 <= len(data):
+            length, attr_type = struct.unpack_from("HH", data, offset)
+            if length < 4:
+                break
+            yield attr_type & NLA_TYPE_MASK, bytes(data[offset + 4 : offset + length])
+            offset += (length + 3) & ~3
+
+    @staticmethod
+    def parse_attrs(data: bytes) -> dict[int, bytes]:
+        """Parse a stream of netlink attributes.
+
+        :param data: Attributes as sent by the kernel.
+        :return: Payloads of the attributes keyed by their type.
+        """
+        return dict(Netlink.iter_attrs(data))
+
+    def request(
+        self, msg_type: int, payload: bytes, dump: bool = False
+    ) -> list[tuple[int, bytes]]:
+        """Send a request and collect the replies.
+
+        :param msg_type: Type of the netlink message.
+        :param payload: Message payload following the netlink header.
+        :param dump: Whether this is a dump request returning many messages.
+        :return: Types and payloads of the reply messages.
+        :raises OSError: When the kernel replies with an error or the reply
+        times out.
+        """
+        flags = NLM_F_REQUEST | (NLM_F_DUMP if dump else 0)
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            header = struct.pack("IHHII", 16 + len(payload), msg_type, flags, seq, 0)
+            self._socket.send(header + payload)
+            replies = []
+            while True:
+                for reply_type, reply in self.receive(seq):
+                    if reply_type == NLMSG_DONE:
+                        return replies
+                    if reply_type == NLMSG_ERROR:
+                        if error := struct.unpack_from("i", reply)[0]:
+                            raise OSError(-error, f"netlink request {msg_type} failed")
+                        return replies
+                    replies.append((reply_type, reply))
+                if not dump and replies:
+                    return replies
+
+    def receive(self, seq: Optional[int] = None) -> Iterator[tuple[int, bytes]]:
+        """Receive one datagram and split it to netlink messages.
+
+        :param seq: Sequence number of the request whose replies are wanted,
+        replies to earlier requests which timed out are skipped. None for all
+        messages.
+        :return: Types and payloads of the received messages.
+        """
+        size = self._socket.recv_into(self._buffer)
+        data = memoryview(self._buffer)[:size]
+        offset = 0
+        while offset + 16 <= size:
+            length, msg_type, _, msg_seq = struct.unpack_from("IHHI", data, offset)
+            if length < 16:
+                break
+            if seq is None or msg_seq == seq:
+                yield msg_type, bytes(data[offset + 16 : offset + length])
+            offset += (length + 3) & ~3
+
+    def resolve_family(self, name: str) -> int:
+        """Find id of a generic netlink family.
+
+        :param name: Name of the family.
+        :return: Id of the family to be used as message type.
+        :raises OSError: When the kernel doesn't know the family.
+        """
+        payload = struct.pack("BBH", CTRL_CMD_GETFAMILY, 1, 0) + self.attr(
+            CTRL_ATTR_FAMILY_NAME, name.encode() + b"\0"
+        )
+        for _, reply in self.request(GENL_ID_CTRL, payload):
+            attrs = self.parse_attrs(reply[4:])
+            return struct.unpack("H", attrs[CTRL_ATTR_FAMILY_ID])[0]
+        raise OSError(f"generic netlink family {name} not found")
+
+
+LinkCallback = Callable[[Optional[int], int, str, int, dict[int, bytes]], None]
+
+
+class LinkMonitor(Thread):
+    """Pass rtnetlink link notifications to subscribers as they arrive.
+
+    Subscribers are called from the monitor thread with the message type
+    (RTM_NEWLINK or RTM_DELLINK), interface index, name, flags and the
+    rest of the attributes. The message type is None when the kernel
+    dropped some notifications and subscribers should resynchronize.
+    """
+
+    def __init__(self, logger: Logger):
+        """Open the netlink socket subscribed to link notifications.
+
+        :param logger: Logger to report failures of subscribers to.
+        :raises OSError: When the socket can't be opened.
+        """
+        super().__init__(name="link-monitor", daemon=True)
+        self.logger = logger
+        self._netlink = Netlink(NETLINK_ROUTE, RTMGRP_LINK)
+        self._subscribers: list[LinkCallback] = []
+
+    def subscribe(self, callback: LinkCallback):
+        """Call callback for every link notification.
+
+        :param callback: Function to be called.
+        """
+        self._subscribers.append(callback)
+
+    def _notify(self, *event):
+        """Call all subscribers with the event."""
+        for callback in self._subscribers:
+            try:
+                callback(*event)
+            except Exception:
+                self.logger.exception("Processing link notification failed")
+
+    def run(self):
+        """Receive notifications forever."""
+        while True:
+            try:
+                messages = list(self._netlink.receive())
+            except OSError as e:
+                # ENOBUFS, notifications have been lost
+                self.logger.warning(f"Receiving link notifications failed: {e}")
+                self._notify(None, 0, "", 0, {})
+                continue
+            for msg_type, payload in messages:
+                if msg_type not in (RTM_NEWLINK, RTM_DELLINK):
+                    continue
+                # struct ifinfomsg
+                _, _, _, index, flags, _ = struct.unpack_from("BBHiII", payload)
+                attrs = Netlink.parse_attrs(payload[16:])
+                name = attrs.get(IFLA_IFNAME, b"").rstrip(b"\0").decode()
+                self._notify(msg_type, index, name, flags, attrs)
+
+
+def enter_netns(path: str):
+    """Move the calling thread to a network namespace.
+
+    Sockets opened and processes started by the thread and threads it starts
+    afterwards belong to that namespace.
+
+    :param path: Path to the namespace, e.g. /run/netns/NAME.
+    :raises OSError: When the namespace can't be entered.
+    """
+    with open(path) as file:
+        if CDLL(None, use_errno=True).setns(file.fileno(), CLONE_NEWNET) != 0:
+            errno = get_errno()
+            raise OSError(errno, f"Cannot enter network namespace {path}")
+
+
+def find_ethernet_links(netlink: Netlink) -> tuple[list[str], list[str]]:
+    """Find links of the namespace of the socket using an rtnetlink dump.
+
+    Ethernet links without link info are considered physical, virtual ones
+    (veth, bridges, VLANs, ...) report their kind in link info.
+
+    :param netlink: Socket of the NETLINK_ROUTE protocol.
+    :return: Names of all links and names of the physical ones.
+    """
+    names = []
+    physical = []
+    # struct ifinfomsg
+    payload = struct.pack("BBHiII", 0, 0, 0, 0, 0, 0)
+    for msg_type, reply in netlink.request(RTM_GETLINK, payload, dump=True):
+        if msg_type != RTM_NEWLINK:
+            continue
+        _, _, link_type, _, _, _ = struct.unpack_from("BBHiII", reply)
+        attrs = Netlink.parse_attrs(reply[16:])
+        name = attrs.get(IFLA_IFNAME, b"").rstrip(b"\0").decode()
+        names.append(name)
+        if link_type == ARPHRD_ETHER and IFLA_LINKINFO not in attrs:
+            physical.append(name)
+    return names, physical
+
+
+@dataclass
+class LinkState:
+    """Carrier state and transitions of a link seen by LinkStateTracker."""
+
+    name: str
+    carrier: bool
+    flaps: int = 0
+    # Unix time of the last carrier change, None until one is seen
+    changed: Optional[float] = None
+    down_seconds: float = 0.0
+    # Monotonic time the carrier went down, None while it's up
+    down_since: Optional[float] = None
+
+
+class LinkStateTracker:
+    """Count carrier changes of links as link notifications arrive.
+
+    The carrier is taken from IFF_LOWER_UP of the link flags, which the
+    kernel sets when the link is up and has a carrier. Every notification
+    of LinkMonitor is compared with the last known state, so flaps shorter
+    than the interval between scrapes are seen without polling ethtool.
+    """
+
+    def __init__(self, logger: Logger):
+        """Read the current state of all links.
+
+        :param logger: Logger to report failures of resynchronization to.
+        :raises OSError: When the rtnetlink dump fails.
+        """
+        self.logger = logger
+        self._netlink = Netlink(NETLINK_ROUTE)
+        self._lock = Lock()
+        self._links: dict[int, LinkState] = {}
+        self.resync()
+
+    def resync(self):
+        """Update the state of all links from an rtnetlink dump.
+
+        :raises OSError: When the dump fails.
+        """
+        links = {}
+        # struct ifinfomsg
+        payload = struct.pack("BBHiII", 0, 0, 0, 0, 0, 0)
+        for msg_type, reply in self._netlink.request(RTM_GETLINK, payload, dump=True):
+            if msg_type != RTM_NEWLINK:
+                continue
+            _, _, _, index, flags, _ = struct.unpack_from("BBHiII", reply)
+            attrs = Netlink.parse_attrs(reply[16:])
+            links[index] = (attrs.get(IFLA_IFNAME, b"").rstrip(b"\0").decode(), flags)
+        with self._lock:
+            for index in self._links.keys() - links.keys():
+                del self._links[index]
+            for index, (name, flags) in links.items():
+                self._update(index, name, flags)
+
+    def link_changed(
+        self,
+        msg_type: Optional[int],
+        index: int,
+        name: str,
+        flags: int,
+        attrs: dict[int, bytes],
+    ):
+        """Record a carrier change of the link, subscriber of LinkMonitor.
+
+        :param msg_type: RTM_NEWLINK, RTM_DELLINK or None if events were lost.
+        :param index: Index of the interface.
+        :param name: Name of the interface.
+        :param flags: Interface flags.
+        :param attrs: Other attributes of the notification.
+        """
+        if msg_type is None:
+            try:
+                self.resync()
+            except OSError as e:
+                self.logger.warning(f"Reading link states failed: {e}")
+            return
+        with self._lock:
+            if msg_type == RTM_DELLINK:
+                self._links.pop(index, None)
+            else:
+                self._update(index, name, flags)
+
+    def _update(self, index: int, name: str, flags: int):
+        """Update the state of a link, the lock has to be held.
+
+        :param index: Index of the interface.
+        :param name: Name of the interface.
+        :param flags: Interface flags.
+        """
+        carrier = bool(flags & IFF_LOWER_UP)
+        now = monotonic()
+        state = self._links.get(index)
+        if state is None:
+            self._links[index] = LinkState(
+                name, carrier, down_since=None if carrier else now
+            )
+            return
+        state.name = name
+        if carrier == state.carrier:
+            return
+        state.carrier = carrier
+        state.changed = time()
+        if carrier:
+            state.down_seconds += now - state.down_since
+            state.down_since = None
+        else:
+            state.flaps += 1
+            state.down_since = now
+
+    def collect(self, interfaces: Sequence[str]) -> Iterator[MetricFamily]:
+        """Yield carrier changes of the interfaces.
+
+        :param interfaces: Names of the interfaces to yield.
+        """
+        flaps = CounterMetricFamily(
+            "node_net_ethtool_link_flaps",
+            "Number of times the carrier of the interface went down",
+            labels=["device"],
+        )
+        changed = GaugeMetricFamily(
+            "node_net_ethtool_link_last_change_timestamp_seconds",
+            "Unix time of the last carrier change of the interface",
+            labels=["device"],
+        )
+        down = CounterMetricFamily(
+            "node_net_ethtool_link_down_seconds",
+            "Number of seconds the interface was without carrier",
+            labels=["device"],
+        )
+        wanted = set(interfaces)
+        now = monotonic()
+        with self._lock:
+            links = sorted(
+                (state.name, state)
+                for state in self._links.values()
+                if state.name in wanted
+            )
+            for name, state in links:
+                flaps.add_metric([name], state.flaps)
+                if state.changed is not None:
+                    changed.add_metric([name], state.changed)
+                down_seconds = state.down_seconds
+                if state.down_since is not None:
+                    down_seconds += now - state.down_since
+                down.add_metric([name], down_seconds)
+        yield flaps
+        yield changed
+        yield down
+
+
+@dataclass
+class VfData:
+    """Configuration and statistics of a single SR-IOV virtual function."""
+
+    vf: int
+    info: dict[str, str] = field(default_factory=dict)
+    stats: list[tuple[str, float]] = field(default_factory=list)
+
+
+def find_vfs(netlink: Netlink) -> dict[str, list[VfData]]:
+    """Read virtual functions of all links using a single rtnetlink dump.
+
+    :param netlink: Socket of the NETLINK_ROUTE protocol.
+    :return: Virtual functions keyed by name of their physical function.
+    :raises OSError: When the dump fails.
+    """
+    # struct ifinfomsg followed by the filter asking for VF information
+    payload = struct.pack("BBHiII", 0, 0, 0, 0, 0, 0) + Netlink.attr(
+        IFLA_EXT_MASK, struct.pack("I", RTEXT_FILTER_VF)
+    )
+    vfs = {}
+    for msg_type, reply in netlink.request(RTM_GETLINK, payload, dump=True):
+        attrs = Netlink.parse_attrs(reply[16:])
+        if msg_type != RTM_NEWLINK or IFLA_VFINFO_LIST not in attrs:
+            continue
+        name = attrs.get(IFLA_IFNAME, b"").rstrip(b"\0").decode()
+        vfs[name] = [
+            _parse_vf_info(vf_info)
+            for attr_type, vf_info in Netlink.iter_attrs(attrs[IFLA_VFINFO_LIST])
+            if attr_type == IFLA_VF_INFO
+        ]
+    return vfs
+
+
+def _parse_vf_info(data: bytes) -> VfData:
+    """Parse a nested IFLA_VF_INFO attribute.
+
+    :param data: Payload of the attribute.
+    :return: Parsed virtual function.
+    """
+    attrs = Netlink.parse_attrs(data)
+    # struct ifla_vf_mac, every struct starts with the VF number
+    vf, mac = struct.unpack_from("I6s", attrs[IFLA_VF_MAC])
+    vf_data = VfData(vf, {"mac": mac.hex(":")})
+    if IFLA_VF_VLAN in attrs:
+        vf_data.info["vlan"] = str(struct.unpack_from("II", attrs[IFLA_VF_VLAN])[1])
+    if IFLA_VF_LINK_STATE in attrs:
+        state = struct.unpack_from("II", attrs[IFLA_VF_LINK_STATE])[1]
+        if state < len(VF_LINK_STATES):
+            vf_data.info["link_state"] = VF_LINK_STATES[state]
+    for attr_type, key in ((IFLA_VF_SPOOFCHK, "spoofchk"), (IFLA_VF_TRUST, "trust")):
+        if attr_type in attrs:
+            setting = struct.unpack_from("Ii", attrs[attr_type])[1]
+            # -1 when the driver doesn't support the setting
+            if setting >= 0:
+                vf_data.info[key] = "on" if setting else "off"
+    for attr_type, value in Netlink.iter_attrs(attrs.get(IFLA_VF_STATS, b"")):
+        if attr_type < len(VF_STATS) and VF_STATS[attr_type]:
+            vf_data.stats.append(
+                (VF_STATS[attr_type], float(struct.unpack("Q", value)[0]))
+            )
+    return vf_data
+
+
+class EthtoolNetlink:
+    """Read link settings of all interfaces using the ethtool netlink family.
+
+    A single dump per message type returns data of every interface, instead
+    of running ethtool once per interface.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        """Open the socket and resolve the ethtool family.
+
+        :param timeout: Number of seconds to wait for a reply, None for ever.
+        :raises OSError: When the kernel has no ethtool netlink support.
+        """
+        self._netlink = Netlink(NETLINK_GENERIC, timeout=timeout)
+        self._family = self._netlink.resolve_family(ETHTOOL_GENL_NAME)
+
+    def _dump(self, command: int) -> Iterator[tuple[str, dict[int, bytes]]]:
+        """Dump ethtool data of all interfaces.
+
+        :param command: Ethtool netlink message to dump.
+        :return: Interface names and attributes of their reply.
+        """
+        flags = struct.pack("I", ETHTOOL_FLAG_COMPACT_BITSETS)
+        header = Netlink.attr(ETHTOOL_A_HEADER_FLAGS, flags)
+        payload = struct.pack("BBH", command, ETHTOOL_GENL_VERSION, 0)
+        payload += Netlink.attr(ETHTOOL_A_HEADER | NLA_F_NESTED, header)
+        for _, reply in self._netlink.request(self._family, payload, dump=True):
+            attrs = Netlink.parse_attrs(reply[4:])
+            header = Netlink.parse_attrs(attrs.get(ETHTOOL_A_HEADER, b""))
+            if name := header.get(ETHTOOL_A_HEADER_DEV_NAME):
+                yield name.rstrip(b"\0").decode(), attrs
+
+    def link_settings(self) -> dict[str, dict[str, str]]:
+        """Read link settings of all interfaces.
+
+        Values are formatted the same way the ethtool command prints them.
+
+        :return: Settings keyed by interface name.
+        """
+        settings: dict[str, dict[str, str]] = {}
+        for name, attrs in self._dump(ETHTOOL_MSG_LINKMODES_GET):
+            values = settings.setdefault(name, {})
+            if speed := attrs.get(ETHTOOL_A_LINKMODES_SPEED):
+                speed = struct.unpack("I", speed)[0]
+                values["speed"] = (
+                    "Unknown!" if speed in (0, SPEED_UNKNOWN) else f"{speed}Mb/s"
+                )
+            if duplex := attrs.get(ETHTOOL_A_LINKMODES_DUPLEX):
+                duplex = duplex[0]
+                values["duplex"] = ETHTOOL_DUPLEXES.get(duplex, f"Unknown! ({duplex})")
+        for name, attrs in self._dump(ETHTOOL_MSG_LINKINFO_GET):
+            if port := attrs.get(ETHTOOL_A_LINKINFO_PORT):
+                port = port[0]
+                settings.setdefault(name, {})["port"] = ETHTOOL_PORTS.get(
+                    port, f"Unknown! ({port})"
+                )
+        for name, attrs in self._dump(ETHTOOL_MSG_LINKSTATE_GET):
+            if link := attrs.get(ETHTOOL_A_LINKSTATE_LINK):
+                settings.setdefault(name, {})["link_detected"] = (
+                    "yes" if link[0] else "no"
+                )
+        return settings
+
+
+class ExporterMetrics:
+    """Metrics about the exporter itself, safe to update from many threads."""
+
+    def __init__(self):
+        """Construct the object with all metrics empty."""
+        self._lock = Lock()
+        # Bucket counts followed by the sum of observed durations
+        self._command_durations: dict[tuple[str, str], list[float]] = {}
+        self._subprocesses = 0
+        self._parse_failures: dict[str, int] = {}
+        self._duplicate_keys: dict[str, int] = {}
+        self._timeouts: dict[tuple[str, str], int] = {}
+
+    def observe_command(self, interface: str, parameter: str, duration: float):
+        """Record a finished ethtool invocation.
+
+        :param interface: Interface ethtool was run for.
+        :param parameter: Parameter ethtool was run with.
+        :param duration: How long ethtool ran, in seconds.
+        """
+        key = (interface, ETHTOOL_COMMANDS.get(parameter, parameter))
+        with self._lock:
+            self._subprocesses += 1
+            if (buckets := self._command_durations.get(key)) is None:
+                buckets = self._command_durations[key] = [0.0] * (
+                    len(COMMAND_DURATION_BUCKETS) + 2
+                )
+            for index, bound in enumerate(COMMAND_DURATION_BUCKETS):
+                if duration <= bound:
+                    buckets[index] += 1
+            buckets[-2] += 1
+            buckets[-1] += duration
+
+    def parse_failure(self, interface: str):
+        """Record a value of interface which could not be parsed.
+
+        :param interface: Interface the value belongs to.
+        """
+        with self._lock:
+            self._parse_failures[interface] = self._parse_failures.get(interface, 0) + 1
+
+    def duplicate_key(self, interface: str, count: int = 1):
+        """Record a statistic reported more than once for interface.
+
+        :param interface: Interface the statistic belongs to.
+        :param count: Number of duplicates.
+        """
+        with self._lock:
+            self._duplicate_keys[interface] = (
+                self._duplicate_keys.get(interface, 0) + count
+            )
+
+    def timeout(self, interface: str, command: str):
+        """Record an ethtool invocation killed because of a timeout.
+
+        :param interface: Interface ethtool was run for.
+        :param command: Name of the invocation.
+        """
+        key = (interface, command)
+        with self._lock:
+            self._timeouts[key] = self._timeouts.get(key, 0) + 1
+
+    def collect(
+        self, duration: float, series: dict[str, int]
+    ) -> Iterator[MetricFamily]:
+        """Yield metrics about the exporter.
+
+        :param duration: Duration of the collection in seconds.
+        :param series: Number of series exported by each collector.
+        """
+        commands = HistogramMetricFamily(
+            "ethtool_exporter_command_duration_seconds",
+            "Duration of ethtool invocations",
+            labels=["device", "command"],
+        )
+        # Canonical bounds, as other clients render them, e.g. le="1.0"
+        bounds = [
+            format_value(bound) for bound in (*COMMAND_DURATION_BUCKETS, float("inf"))
+        ]
+        with self._lock:
+            for (interface, command), buckets in sorted(
+                self._command_durations.items()
+            ):
+                commands.add_metric(
+                    [interface, command],
+                    list(zip(bounds, buckets[:-1])),
+                    buckets[-1],
+                )
+            subprocesses = self._subprocesses
+            parse_failures = sorted(self._parse_failures.items())
+            duplicate_keys = sorted(self._duplicate_keys.items())
+            timeouts = sorted(self._timeouts.items())
+        yield commands
+        yield GaugeMetricFamily(
+            "ethtool_exporter_collect_duration_seconds",
+            "Duration of the last collection",
+            value=duration,
+        )
+        yield CounterMetricFamily(
+            "ethtool_exporter_subprocesses",
+            "Number of ethtool processes spawned",
+            value=subprocesses,
+        )
+        for name, documentation, counts in (
+            (
+                "ethtool_exporter_parse_failures",
+                "Number of values which could not be parsed",
+                parse_failures,
+            ),
+            (
+                "ethtool_exporter_duplicate_keys",
+                "Number of statistics reported more than once",
+                duplicate_keys,
+            ),
+        ):
+            counter = CounterMetricFamily(name, documentation, labels=["device"])
+            for interface, count in counts:
+                counter.add_metric([interface], count)
+            yield counter
+        counter = CounterMetricFamily(
+            "ethtool_exporter_command_timeouts",
+            "Number of ethtool invocations killed because of a timeout",
+            labels=["device", "command"],
+        )
+        for key, count in timeouts:
+            counter.add_metric(list(key), count)
+        yield counter
+        gauge = GaugeMetricFamily(
+            "ethtool_exporter_series",
+            "Number of series exported in the last collection",
+            labels=["collector"],
+        )
+        for collector, count in series.items():
+            gauge.add_metric([collector], count)
+        yield gauge
+
+
+class CircuitBreaker:
+    """Stop running ethtool for interfaces and commands which keep failing.
+
+    After threshold consecutive failures of a command for an interface, the
+    breaker opens and the command is skipped for the backoff period. Then a
+    single probe is let through (half-open state): its success closes the
+    breaker, its failure opens it again for twice as long, up to max_backoff.
+    """
+
+    def __init__(self, threshold: int, backoff: float, max_backoff: float):
+        """Construct the object with all breakers closed.
+
+        :param threshold: Number of consecutive failures opening a breaker.
+        :param backoff: Number of seconds a breaker stays open after tripping.
+        :param max_backoff: Maximum number of seconds a breaker stays open.
+        """
+        self.threshold = threshold
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._lock = Lock()
+        # State, consecutive failures, current backoff and end of the backoff
+        self._breakers: dict[tuple[str, str], list] = {}
+        self._trips: dict[tuple[str, str], int] = {}
+
+    def allow(self, key: tuple[str, str]) -> bool:
+        """Check whether a command may be run, moving open breakers to half-open.
+
+        :param key: Interface and command.
+        :return: Bool if the command may be run.
+        """
+        with self._lock:
+            if (breaker := self._breakers.get(key)) is None or breaker[0] == "closed":
+                return True
+            if breaker[0] == "open" and monotonic() >= breaker[3]:
+                breaker[0] = "half_open"
+                return True
+            return False
+
+    def success(self, key: tuple[str, str]):
+        """Record a successful run, closing the breaker.
+
+        :param key: Interface and command.
+        """
+        with self._lock:
+            if key in self._breakers:
+                self._breakers[key] = ["closed", 0, 0.0, 0.0]
+
+    def failure(self, key: tuple[str, str]) -> Optional[float]:
+        """Record a failed run, opening the breaker if needed.
+
+        :param key: Interface and command.
+        :return: Number of seconds the breaker has been opened for, None if
+        it stays closed.
+        """
+        with self._lock:
+            breaker = self._breakers.setdefault(key, ["closed", 0, 0.0, 0.0])
+            breaker[1] += 1
+            if breaker[0] == "half_open":
+                breaker[2] = min(breaker[2] * 2, self.max_backoff)
+            elif breaker[1] >= self.threshold:
+                breaker[2] = min(self.backoff, self.max_backoff)
+            else:
+                return None
+            breaker[0] = "open"
+            breaker[3] = monotonic() + breaker[2]
+            self._trips[key] = self._trips.get(key, 0) + 1
+            return breaker[2]
+
+    def collect(self) -> Iterator[MetricFamily]:
+        """Yield states of the breakers."""
+        states = GaugeMetricFamily(
+            "ethtool_exporter_breaker_state",
+            "State of the circuit breaker of ethtool invocations, 1 for the "
+            "current state",
+            labels=["device", "command", "state"],
+        )
+        backoffs = GaugeMetricFamily(
+            "ethtool_exporter_breaker_backoff_seconds",
+            "Number of seconds the circuit breaker stays open for when tripped",
+            labels=["device", "command"],
+        )
+        trips = CounterMetricFamily(
+            "ethtool_exporter_breaker_trips",
+            "Number of times the circuit breaker has opened",
+            labels=["device", "command"],
+        )
+        with self._lock:
+            for key, (state, _, backoff, _) in sorted(self._breakers.items()):
+                for name in BREAKER_STATES:
+                    states.add_metric([*key, name], float(name == state))
+                backoffs.add_metric(list(key), backoff)
+                trips.add_metric(list(key), self._trips.get(key, 0))
+        yield states
+        yield backoffs
+        yield trips
+
+
+class SampleRing:
+    """Ring buffers of sampled counters of a single interface.
+
+    Times of the samples are shared by all counters, every buffer is
+    a preallocated array of doubles overwritten in place.
+    """
+
+    __slots__ = (
+        "source",
+        "keys",
+        "indices",
+        "times",
+        "values",
+        "written",
+        "exported",
+    )
+
+    def __init__(self, source: tuple[str, ...], indices: tuple[int, ...], size: int):
+        """Allocate the buffers.
+
+        :param source: Names of all ethtool statistics of the interface.
+        :param indices: Positions of the sampled counters in the statistics.
+        :param size: Number of samples kept.
+        """
+        self.source = source
+        self.keys = tuple(source[index] for index in indices)
+        self.indices = indices
+        self.times = array("d", bytes(8 * size))
+        self.values = [array("d", bytes(8 * size)) for _ in indices]
+        # Number of samples written and already covered by exported rates
+        self.written = 0
+        self.exported = 0
+
+    def append(self, timestamp: float, counters: memoryview):
+        """Store a sample.
+
+        :param timestamp: Monotonic time of the sample.
+        :param counters: All ethtool statistics of the interface.
+        """
+        position = self.written % len(self.times)
+        self.times[position] = timestamp
+        for values, index in zip(self.values, self.indices):
+            values[position] = counters[index]
+        self.written += 1
+
+    def rates(self) -> Iterator[tuple[str, list[float]]]:
+        """Compute per-second rates between samples since the last call.
+
+        :return: Names of the counters and their rates, sorted.
+        """
+        size = len(self.times)
+        first = max(self.exported - 1, self.written - size, 0)
+        positions = [sample % size for sample in range(first, self.written)]
+        self.exported = self.written
+        for key, values in zip(self.keys, self.values):
+            rates = []
+            for previous, current in zip(positions, positions[1:]):
+                elapsed = self.times[current] - self.times[previous]
+                delta = values[current] - values[previous]
+                # Negative delta means the counter has been reset
+                if elapsed > 0 and delta >= 0:
+                    rates.append(delta / elapsed)
+            rates.sort()
+            yield key, rates
+
+
+class CounterSampler(Thread):
+    """Sample selected statistics many times between scrapes.
+
+    Statistics are read using the ioctl, so sampling doesn't run any
+    process. On every scrape the peak and quantiles of per-second rates
+    observed since the previous scrape are exported.
+    """
+
+    def __init__(self, collector: "EthtoolCollector"):
+        """Construct the sampler.
+
+        :param collector: Collector whose interfaces and settings are used.
+        """
+        super().__init__(name="counter-sampler", daemon=True)
+        self.collector = collector
+        self.ethtool_ioctl = EthtoolIoctl()
+        self.regex = re.compile(collector.args.sample_regex)
+        self.interval = collector.args.sample_interval_ms / 1000
+        self.size = collector.args.sample_buffer_size
+        self._lock = Lock()
+        self._rings: dict[str, SampleRing] = {}
+
+    def sample(self, interface: str):
+        """Read statistics of interface and store the selected ones.
+
+        :param interface: Interface to be sampled.
+        """
+        try:
+            keys, counters = self.ethtool_ioctl.read(interface)
+        except OSError as e:
+            self.collector.logger.debug(f"Sampling {interface} failed: {e}")
+            return
+        timestamp = monotonic()
+        with self._lock:
+            ring = self._rings.get(interface)
+            if ring is None or ring.source is not keys:
+                # Statistics of the interface are new or have changed
+                indices = tuple(
+                    index for index, key in enumerate(keys) if self.regex.match(key)
+                )
+                ring = self._rings[interface] = SampleRing(keys, indices, self.size)
+            ring.append(timestamp, counters)
+
+    def run(self):
+        """Sample all interfaces every interval forever."""
+        deadline = monotonic()
+        while True:
+            interfaces = self.collector.find_physical_interfaces()
+            for interface in interfaces:
+                self.sample(interface)
+            with self._lock:
+                for interface in self._rings.keys() - set(interfaces):
+                    del self._rings[interface]
+            deadline += self.interval
+            if (delay := deadline - monotonic()) > 0:
+                sleep(delay)
+            else:
+                # Sampling is too slow for the interval, don't try to catch up
+                deadline = monotonic()
+
+    def collect(
+        self, devices: Optional[frozenset[str]] = None
+    ) -> Iterator[GaugeMetricFamily]:
+        """Yield peaks and quantiles of rates observed since the last call.
+
+        :param devices: Interfaces to yield the rates of, all when None.
+        Rates of other interfaces are kept for the next call.
+        """
+        peaks = GaugeMetricFamily(
+            "node_net_ethtool_sampled_rate_max",
+            "Highest per-second rate of the statistic between two samples",
+            labels=["device", "type"],
+        )
+        quantiles = GaugeMetricFamily(
+            "node_net_ethtool_sampled_rate",
+            "Quantiles of per-second rates of the statistic between two samples",
+            labels=["device", "type", "quantile"],
+        )
+        with self._lock:
+            for interface, ring in sorted(self._rings.items()):
+                if devices is not None and interface not in devices:
+                    continue
+                for key, rates in ring.rates():
+                    if not rates:
+                        continue
+                    peaks.add_metric([interface, key], rates[-1])
+                    for quantile in SAMPLED_RATE_QUANTILES:
+                        rate = rates[min(len(rates) - 1, int(quantile * len(rates)))]
+                        quantiles.add_metric([interface, key, str(quantile)], rate)
+        yield peaks
+        yield quantiles
+
+
+class SeriesStore:
+    """Layout of the series of one metric family and interface.
+
+    Every series has positions of the statistics it is made of, so an update
+    only copies values to a new compact array. Every collection gets arrays
+    of its own, as snapshots may still be rendered while later collections
+    run.
+    """
+
+    __slots__ = ("labels", "sources", "reduce")
+
+    def __init__(
+        self,
+        labels: list[tuple[str, ...]],
+        sources: list[tuple[int, ...]],
+        reduce: Optional[Callable[[list[float]], float]] = None,
+    ):
+        """Construct the object.
+
+        :param labels: Label values of the series, except the device.
+        :param sources: Positions of the statistics making up every series.
+        :param reduce: Function combining the statistics, None when every
+        series is made of a single statistic.
+        """
+        self.labels = tuple(labels)
+        self.sources = tuple(sources)
+        self.reduce = reduce
+
+    def update(self, values: Sequence[float]) -> array:
+        """Compute the series from statistics.
+
+        :param values: All statistics of the interface.
+        :return: Values of the series.
+        """
+        buffer = array("d", bytes(8 * len(self.labels)))
+        if self.reduce is None:
+            for position, (index,) in enumerate(self.sources):
+                buffer[position] = values[index]
+        else:
+            for position, indices in enumerate(self.sources):
+                buffer[position] = self.reduce([values[index] for index in indices])
+        return buffer
+
+
+@dataclass
+class StatsLayout:
+    """Series made from statistics of an interface with the given names."""
+
+    keys: tuple[str, ...]
+    stores: dict[str, SeriesStore]
+    duplicates: int = 0
+
+
+class StoredFamily:
+    """Metric family whose samples are made from series stores when rendered.
+
+    Quacks like the metric families of prometheus_client, but keeps only
+    references to the arrays of values instead of thousands of samples.
+    """
+
+    def __init__(self, name: str, documentation: str, labels: list[str]):
+        """Construct the object with no series.
+
+        :param name: Name of the metric family.
+        :param documentation: Help text of the family.
+        :param labels: Names of the labels, starting with the device.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.type = "gauge"
+        self.unit = ""
+        self.labels = labels
+        self.stores: list[tuple[str, tuple[tuple[str, ...], ...], array]] = []
+
+    def add_store(self, interface: str, store: SeriesStore, values: array):
+        """Add series of an interface.
+
+        :param interface: Value of the device label.
+        :param store: Store the values have been computed by.
+        :param values: Values of the series.
+        """
+        self.stores.append((interface, store.labels, values))
+
+    def __len__(self) -> int:
+        """Count the series."""
+        return sum(len(values) for _, _, values in self.stores)
+
+    @property
+    def samples(self) -> Iterator[Sample]:
+        """Make samples of all series."""
+        name = self.name
+        device, *labels = self.labels
+        for interface, label_values, values in self.stores:
+            for label_value, value in zip(label_values, values):
+                sample_labels = {device: interface}
+                sample_labels.update(zip(labels, label_value))
+                yield Sample(name, sample_labels, value, None, None)
+
+
+@dataclass
+class TransceiverData:
+    """Parsed `ethtool -m` output of a single transceiver module."""
+
+    info: dict[str, str] = field(default_factory=dict)
+    sensors: list[tuple[str, float]] = field(default_factory=list)
+    alarms: list[tuple[str, str]] = field(default_factory=list)
+    sensors_read: float = 0.0
 
 
 class EthtoolCollector:
     """Collect ethtool metrics,publish them via http or save them to a file."""
 
-    def __init__(self, args: Optional[list[str]] = None):
-        """Construct the object and parse the arguments."""
+    def __init__(self, args: Optional[list[str]] = None, netns: str = ""):
+        """Construct the object and parse the arguments.
+
+        :param args: Arguments to use instead of the command line.
+        :param netns: Name of the network namespace the object is constructed
+        in by NetnsWorker, empty for the exporter's own namespace.
+        """
         self.basic_info_whitelist = (
             "speed",
             "duplex",
@@ -91,8 +1617,89 @@ class EthtoolCollector:
             for alarm in self.xcvr_alarms_ext
         ]
         self.ethtool: str = ""
-        self.args: Namespace = self._parse_arguments(args or argv[1:])
+        self.arguments = args or argv[1:]
+        self.netns = netns
+        self.args: Namespace = self._parse_arguments(self.arguments)
         self.logger: Logger = self._setup_logger()
+        self.collectors: frozenset[str] = frozenset(self.args.collectors)
+        self.key_filters: dict[
+            str, tuple[Optional[re.Pattern], Optional[re.Pattern]]
+        ] = self._compile_key_filters()
+        self._allowed_keys: dict[tuple[str, str], bool] = {}
+        self._stats_keys: dict[bytes, str] = {}
+        self.queue_rules: list[re.Pattern] = [
+            re.compile(rule) for rule in self.args.queue_rule + list(QUEUE_RULES)
+        ]
+        self._queue_keys: dict[str, Optional[tuple[str, str]]] = {}
+        self._stats_layouts: dict[str, StatsLayout] = {}
+        self.ethtool_ioctl: Optional[EthtoolIoctl] = None
+        if self.args.stats_backend == "ioctl":
+            self.ethtool_ioctl = EthtoolIoctl()
+        self.timeouts = {**COMMAND_TIMEOUTS, **dict(self.args.timeout)}
+        self.ethtool_netlink: Optional[EthtoolNetlink] = None
+        if self.args.info_backend == "netlink":
+            try:
+                self.ethtool_netlink = EthtoolNetlink(self.timeouts["info"])
+            except OSError as e:
+                self.logger.warning(
+                    f"Ethtool netlink is not available, falling back to ethtool: {e}"
+                )
+        self.xcvr_cache: dict[str, TransceiverData] = {}
+        self.metrics = ExporterMetrics()
+        self.breaker = CircuitBreaker(
+            self.args.breaker_threshold,
+            self.args.breaker_backoff,
+            self.args.breaker_max_backoff,
+        )
+        self.interface_regex: re.Pattern = re.compile(self.args.interface_regex)
+        self._interfaces: Optional[list[str]] = None
+        self._interfaces_checked = 0.0
+        self._scanned_generation = -1
+        self._interfaces_generation = 0
+        self._interface_names: frozenset[str] = frozenset()
+        self.route_netlink: Optional[Netlink] = None
+        if netns:
+            self.route_netlink = Netlink(NETLINK_ROUTE, timeout=self.timeouts["info"])
+        self.vf_netlink: Optional[Netlink] = None
+        if "vf" in self.collectors:
+            self.vf_netlink = Netlink(NETLINK_ROUTE, timeout=self.timeouts["info"])
+        self.netns_workers: dict[str, "NetnsWorker"] = {}
+        # Threads watching the host between collections are of no use to a
+        # single collection, and couldn't be stopped when a namespace goes away
+        watching = not netns and not self.args.oneshot
+        self.link_monitor: Optional[LinkMonitor] = None
+        track_links = "link" in self.collectors and watching
+        if watching and (self.args.interface_rescan_interval > 0 or track_links):
+            try:
+                self.link_monitor = LinkMonitor(self.logger)
+            except OSError as e:
+                self.logger.warning(
+                    f"Cannot watch link notifications, interfaces will be "
+                    f"looked up on every collection and carrier changes are "
+                    f"not tracked: {e}"
+                )
+            else:
+                self.link_monitor.subscribe(self._link_changed)
+        self.link_tracker: Optional[LinkStateTracker] = None
+        if track_links and self.link_monitor:
+            try:
+                self.link_tracker = LinkStateTracker(self.logger)
+            except OSError as e:
+                self.logger.warning(f"Cannot read link states: {e}")
+            else:
+                self.link_monitor.subscribe(self.link_tracker.link_changed)
+        if self.link_monitor:
+            # Notifications queue in the socket of the monitor until it starts
+            self.link_monitor.start()
+        self.sampler: Optional[CounterSampler] = None
+        if self.args.sample_regex and watching:
+            self.sampler = CounterSampler(self)
+            self.sampler.start()
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.args.workers, thread_name_prefix="ethtool-collector"
+        )
+        # Serializes collections, scoped scrapes may run alongside full ones
+        self._collect_lock = Lock()
 
     def _setup_logger(self) -> Logger:
         """Setup a logger for exporter.
@@ -133,10 +1740,28 @@ class EthtoolCollector:
         parser.add_argument(
             "-i",
             "--interval",
-            type=int,
+            type=float,
             help=(
-                "Number of seconds between updates of the textfile. "
-                "Default is 5 seconds"
+                "Number of seconds between updates of the textfile or of the "
+                "background snapshot, may be fractional. Default is 5 seconds"
+            ),
+        )
+        parser.add_argument(
+            "--phase-key",
+            default=gethostname(),
+            help=(
+                "String hashed into the offset of textfile updates within "
+                "--interval, which spreads updates of hosts started at the same "
+                "time. Default is the hostname, an empty string disables the offset"
+            ),
+        )
+        parser.add_argument(
+            "--background",
+            action="store_true",
+            default=False,
+            help=(
+                "Collect data every --interval seconds in a background thread "
+                "and answer HTTP scrapes from the last snapshot"
             ),
         )
         parser.add_argument(
@@ -145,6 +1770,32 @@ class EthtoolCollector:
             default=".*",
             help="Only scrape interfaces whose name matches this regex",
         )
+        parser.add_argument(
+            "--interface-rescan-interval",
+            type=int,
+            default=60,
+            help=(
+                "Number of seconds to cache the list of interfaces for. It is "
+                "refreshed sooner when an interface is added or removed. "
+                "0 looks interfaces up on every collection. Default is 60"
+            ),
+        )
+        parser.add_argument(
+            "--sysfs-root",
+            default="/sys",
+            help="Where sysfs is mounted. Default is /sys",
+        )
+        parser.add_argument(
+            "--netns",
+            choices=("own", "named", "pids", "all"),
+            default="own",
+            help=(
+                "Network namespaces to collect data from in addition to the "
+                "exporter's own one: none, named ones from /run/netns, those "
+                "of processes in /proc or both. Data of other namespaces has "
+                "their name in the netns label. Default is own"
+            ),
+        )
         parser.add_argument(
             "-1",
             "--oneshot",
@@ -165,6 +1816,182 @@ class EthtoolCollector:
             default=False,
             help="Silence any error messages and warnings",
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help=(
+                "Number of threads collecting data from interfaces "
+                "concurrently. Default is 4"
+            ),
+        )
+        parser.add_argument(
+            "--xcvr-sensors-interval",
+            type=int,
+            default=0,
+            help=(
+                "Number of seconds to serve the last transceiver sensor and "
+                "alarm values for before reading the module EEPROM again. "
+                "Default is 0, read on every collection"
+            ),
+        )
+        parser.add_argument(
+            "--sample-regex",
+            help=(
+                "Sample statistics whose name matches this regex every "
+                "--sample-interval-ms and export peaks and quantiles of their "
+                "rates between scrapes. Requires the ioctl stats backend"
+            ),
+        )
+        parser.add_argument(
+            "--sample-interval-ms",
+            type=int,
+            default=250,
+            help="Number of milliseconds between two samples. Default is 250",
+        )
+        parser.add_argument(
+            "--sample-buffer-size",
+            type=int,
+            default=240,
+            help=(
+                "Number of samples kept for every statistic, older ones are "
+                "overwritten. Default is 240, i.e. 60s of samples taken "
+                "every 250ms"
+            ),
+        )
+        parser.add_argument(
+            "--queue-stats",
+            choices=("raw", "label", "sum"),
+            default="raw",
+            help=(
+                "How to export per-queue statistics: as they are, with the "
+                "queue number in the queue label of node_net_ethtool_queue, "
+                "or only summed over queues in node_net_ethtool_queue_sum. "
+                "Default is raw"
+            ),
+        )
+        parser.add_argument(
+            "--queue-max",
+            action="store_true",
+            default=False,
+            help=(
+                "With --queue-stats sum, also export the highest per-queue "
+                "value in node_net_ethtool_queue_max"
+            ),
+        )
+        parser.add_argument(
+            "--queue-rule",
+            action="append",
+            default=[],
+            metavar="REGEX",
+            help=(
+                "Regex recognizing per-queue statistics, with a queue group "
+                "matching the queue number and optionally a type group "
+                "matching the statistic name. Can be used multiple times, "
+                "takes precedence over built-in rules"
+            ),
+        )
+        parser.add_argument(
+            "--stats-backend",
+            choices=("ioctl", "ethtool"),
+            default="ioctl",
+            help=(
+                "How to read NIC statistics: in-process SIOCETHTOOL ioctl or "
+                "by running 'ethtool -S'. Interfaces where the ioctl fails "
+                "fall back to ethtool. Default is ioctl"
+            ),
+        )
+        parser.add_argument(
+            "--info-backend",
+            choices=("netlink", "ethtool"),
+            default="netlink",
+            help=(
+                "How to read link settings: a single ethtool netlink dump for "
+                "all interfaces or by running 'ethtool' for each of them. "
+                "Default is netlink"
+            ),
+        )
+        parser.add_argument(
+            "--collectors",
+            type=self._parse_collectors,
+            default="stats,info,xcvr",
+            help=(
+                "Comma separated list of metric families to collect. Ethtool "
+                f"is not run for disabled ones. Choose from {', '.join(COLLECTORS)} "
+                "or xcvr for all transceiver families. vf reads SR-IOV virtual "
+                "functions of all interfaces using rtnetlink, link counts "
+                "carrier changes from link notifications. Default is "
+                "stats,info,xcvr"
+            ),
+        )
+        parser.add_argument(
+            "--timeout",
+            action="append",
+            default=[],
+            type=self._parse_timeout,
+            metavar="COMMAND=SECONDS",
+            help=(
+                "Kill ethtool if it runs longer than this for the command, "
+                "one of stats, info or xcvr. Can be used multiple times. "
+                "Defaults are stats=5, info=5 and xcvr=10"
+            ),
+        )
+        parser.add_argument(
+            "--collection-timeout",
+            type=float,
+            default=30,
+            help=(
+                "Number of seconds to wait for data of all interfaces. Interfaces "
+                "still being collected are dropped and count as failures of "
+                "their stats or info breaker. Default is 30"
+            ),
+        )
+        parser.add_argument(
+            "--breaker-threshold",
+            type=int,
+            default=3,
+            help=(
+                "Number of consecutive timeouts or failures of ethtool after "
+                "which the command is not run for the interface for "
+                "--breaker-backoff seconds. Default is 3"
+            ),
+        )
+        parser.add_argument(
+            "--breaker-backoff",
+            type=float,
+            default=30,
+            help=(
+                "Number of seconds to skip a failing command for. It doubles "
+                "every time the next try fails. Default is 30"
+            ),
+        )
+        parser.add_argument(
+            "--breaker-max-backoff",
+            type=float,
+            default=900,
+            help="Maximum number of seconds to skip a failing command for. "
+            "Default is 900",
+        )
+        parser.add_argument(
+            "--include",
+            action="append",
+            default=[],
+            metavar="COLLECTOR=REGEX",
+            help=(
+                "Only include values of the collector whose name matches "
+                "the regex. Can be used multiple times"
+            ),
+        )
+        parser.add_argument(
+            "--exclude",
+            action="append",
+            default=[],
+            metavar="COLLECTOR=REGEX",
+            help=(
+                "Exclude values of the collector whose name matches "
+                "the regex. Can be used multiple times"
+            ),
+        )
         wb_list_group = parser.add_mutually_exclusive_group()
         wb_list_group.add_argument(
             "-w",
@@ -201,10 +2028,47 @@ class EthtoolCollector:
             self.logger.error("Oneshot has to be used with textfile mode")
             parser.print_help()
             exit(1)
-        if parsed_arguments.interval and not parsed_arguments.textfile_name:
-            self.logger.error("Interval has to be used with textfile mode")
+        if parsed_arguments.background and not (
+            parsed_arguments.port or parsed_arguments.listen
+        ):
+            parser.error("Background collection has to be used with HTTP mode")
+        if (
+            parsed_arguments.interval
+            and not parsed_arguments.textfile_name
+            and not parsed_arguments.background
+        ):
+            self.logger.error(
+                "Interval has to be used with textfile mode or background collection"
+            )
             parser.print_help()
             exit(1)
+        if parsed_arguments.interval is not None and parsed_arguments.interval <= 0:
+            parser.error("Interval has to be positive")
+        if parsed_arguments.workers < 1:
+            parser.error("Number of workers has to be at least 1")
+        if parsed_arguments.sample_regex:
+            if parsed_arguments.stats_backend != "ioctl":
+                parser.error("Sampling requires the ioctl stats backend")
+            if parsed_arguments.sample_interval_ms < 10:
+                parser.error("Sample interval has to be at least 10ms")
+            if parsed_arguments.sample_buffer_size < 2:
+                parser.error("Sample buffer has to hold at least 2 samples")
+        if parsed_arguments.breaker_threshold < 1:
+            parser.error("Breaker threshold has to be at least 1")
+        if parsed_arguments.collection_timeout <= 0:
+            parser.error("Collection timeout has to be positive")
+        if parsed_arguments.breaker_backoff <= 0:
+            parser.error("Breaker backoff has to be positive")
+        for rule in parsed_arguments.queue_rule:
+            try:
+                if "queue" not in re.compile(rule).groupindex:
+                    parser.error(f'Queue rule "{rule}" has no queue group')
+            except re.error as e:
+                parser.error(f'Invalid queue rule "{rule}": {e}')
+        for key_filter in parsed_arguments.include + parsed_arguments.exclude:
+            name, sep, _ = key_filter.partition("=")
+            if not sep or (name not in COLLECTORS and name not in COLLECTOR_ALIASES):
+                parser.error(f'Invalid filter "{key_filter}", use COLLECTOR=REGEX')
         if (
             parsed_arguments.listen_address
             and not parsed_arguments.port
@@ -214,27 +2078,125 @@ class EthtoolCollector:
             parser.print_help()
             exit(1)
 
+    @staticmethod
+    def _parse_collectors(value: str) -> list[str]:
+        """Parse comma separated list of collectors and expand aliases.
+
+        :param value: Value of the --collectors argument.
+        :return: Names of the enabled collectors.
+        """
+        collectors = []
+        for name in filter(None, (name.strip() for name in value.split(","))):
+            if name in COLLECTOR_ALIASES:
+                collectors.extend(COLLECTOR_ALIASES[name])
+            elif name in COLLECTORS:
+                collectors.append(name)
+            else:
+                raise ArgumentTypeError(f"unknown collector {name}")
+        return collectors
+
+    @staticmethod
+    def _parse_timeout(value: str) -> tuple[str, float]:
+        """Parse timeout of an ethtool command.
+
+        :param value: Value of the --timeout argument.
+        :return: Name of the command and the timeout in seconds.
+        """
+        command, _, seconds = value.partition("=")
+        if command not in COMMAND_TIMEOUTS:
+            raise ArgumentTypeError(f"unknown command {command}")
+        try:
+            timeout = float(seconds)
+        except ValueError:
+            raise ArgumentTypeError(f"invalid timeout {seconds}")
+        if timeout <= 0:
+            raise ArgumentTypeError("timeout has to be positive")
+        return command, timeout
+
+    def _compile_key_filters(
+        self,
+    ) -> dict[str, tuple[Optional[re.Pattern], Optional[re.Pattern]]]:
+        """Compile --include and --exclude filters of every collector.
+
+        Filters given for the same collector multiple times are joined,
+        -w and -b are filters of the stats collector.
+
+        :return: Include and exclude pattern keyed by collector name.
+        """
+        patterns: dict[str, tuple[list[str], list[str]]] = {
+            name: ([], []) for name in COLLECTORS
+        }
+        if self.args.whitelist_regex:
+            patterns["stats"][0].append(self.args.whitelist_regex)
+        if self.args.blacklist_regex:
+            patterns["stats"][1].append(self.args.blacklist_regex)
+        for index, key_filters in enumerate((self.args.include, self.args.exclude)):
+            for key_filter in key_filters:
+                name, _, regex = key_filter.partition("=")
+                for collector in COLLECTOR_ALIASES.get(name, (name,)):
+                    patterns[collector][index].append(regex)
+        return {
+            name: tuple(
+                (
+                    re.compile("|".join(f"(?:{regex})" for regex in regexes))
+                    if regexes
+                    else None
+                )
+                for regexes in (include, exclude)
+            )
+            for name, (include, exclude) in patterns.items()
+        }
+
+    def key_allowed(self, collector: str, key: str) -> bool:
+        """Check whether key passes the filters of the collector.
+
+        Results are memoized, so steady-state scrapes do no regex matching.
+
+        :param collector: Name of the collector the key belongs to.
+        :param key: Name of the value to be checked against filters.
+        :return: Bool if the value is allowed.
+        """
+        try:
+            return self._allowed_keys[collector, key]
+        except KeyError:
+            pass
+        include, exclude = self.key_filters[collector]
+        allowed = (include is None or include.match(key) is not None) and (
+            exclude is None or exclude.match(key) is None
+        )
+        self._allowed_keys[collector, key] = allowed
+        return allowed
+
     def whitelist_blacklist_check(self, stat_name: str) -> bool:
         """Check whether stat_name matches whitelist or blacklist.
 
         :param stat_name: Name of the statistic to be checked against lists.
         :return: Bool if statistic is allowed.
         """
-        if self.args.whitelist_regex:
-            return re.match(self.args.whitelist_regex, stat_name) is not None
-        if self.args.blacklist_regex:
-            return re.match(self.args.blacklist_regex, stat_name) is None
-        return True
+        return self.key_allowed("stats", stat_name)
 
-    def run_ethtool(self, interface: str, parameter: str) -> Optional[bytes]:
+    def run_ethtool(
+        self, interface: str, parameter: str, gated: bool = False
+    ) -> Optional[bytes]:
         """Run ethtool with select parameter.
 
+        Commands are killed after their timeout and skipped while their
+        circuit breaker is open.
+
         :param interface: Interface we want to make metrics from.
         :param parameter: Additional params for running ethtool command.
+        :param gated: Whether the caller has already been let through by the
+        circuit breaker of the command.
         """
+        name = ETHTOOL_COMMANDS.get(parameter, parameter)
+        key = (interface, name)
+        if not gated and not self.breaker.allow(key):
+            self.logger.debug(f"Skipping ethtool {name} of {interface}, breaker open")
+            return None
         command = [self.ethtool, interface]
         if parameter:
             command = [self.ethtool, parameter, interface]
+        started = monotonic()
         try:
             self.logger.debug(f"ethtool command: {command}")
             proc = Popen(command, stdout=PIPE, stderr=PIPE)
@@ -244,66 +2206,267 @@ class EthtoolCollector:
         except PermissionError as e:
             self.logger.critical(f"Permission error trying to run {self.ethtool}: {e}")
             exit(1)
-        data, err = proc.communicate()
+        try:
+            data, err = proc.communicate(timeout=self.timeouts[name])
+        except TimeoutExpired:
+            proc.kill()
+            try:
+                proc.communicate(timeout=KILL_TIMEOUT)
+            except TimeoutExpired:
+                # Stuck in the driver, it exits once the driver lets it go
+                self.logger.error(
+                    f"Ethtool {name} of interface {interface} did not exit after "
+                    "being killed, abandoning it"
+                )
+            self.metrics.observe_command(interface, parameter, monotonic() - started)
+            self.metrics.timeout(interface, name)
+            self.logger.error(
+                f"Ethtool {name} of interface {interface} timed out after "
+                f"{self.timeouts[name]}s"
+            )
+            self._command_failed(key)
+            return None
+        self.metrics.observe_command(interface, parameter, monotonic() - started)
         if proc.returncode != 0:
             self.logger.error(
                 "Ethtool returned non-zero return "
                 f"code for interface {interface}, the message "
                 f"was: {err}"
             )
+            if name == "xcvr":
+                # Empty cages fail every time, only timeouts mean a hung module
+                self.breaker.success(key)
+            else:
+                self._command_failed(key)
             return None
+        self.breaker.success(key)
         return data
 
-    def update_ethtool_stats(self, interface: str, gauge: GaugeMetricFamily):
-        """Update gauge with statistics from ethtool for interface.
+    def _command_failed(self, key: tuple[str, str]):
+        """Record a failed ethtool invocation in its circuit breaker.
+
+        :param key: Interface and name of the command.
+        """
+        if (backoff := self.breaker.failure(key)) is not None:
+            self.logger.warning(
+                f"Skipping {key[1]} of interface {key[0]} for "
+                f"{backoff}s after repeated failures"
+            )
+
+    def update_ethtool_stats(self, interface: str, families: MetricFamilies):
+        """Update gauges with statistics from ethtool for interface.
+
+        :param interface: Interface we make metrics from.
+        :param families: Destination metrics to put the data in.
+        """
+        key = (interface, "stats")
+        if not self.breaker.allow(key):
+            self.logger.debug(f"Skipping statistics of {interface}, breaker open")
+            return
+        if self.ethtool_ioctl:
+            try:
+                keys, values = self.ethtool_ioctl.read(interface)
+            except OSError as e:
+                self.logger.debug(
+                    f"Reading statistics of {interface} using ioctl failed, "
+                    f"falling back to ethtool: {e}"
+                )
+            else:
+                self.breaker.success(key)
+                self._add_stats(interface, keys, values, families)
+                return
+        if not (data := self.run_ethtool(interface, "-S", gated=True)):
+            return
+        stats = list(self._parse_ethtool_stats(interface, data))
+        keys = tuple(key for key, _ in stats)
+        self._add_stats(interface, keys, [value for _, value in stats], families)
+
+    def _parse_ethtool_stats(
+        self, interface: str, data: bytes
+    ) -> Iterator[tuple[str, float]]:
+        """Parse the output of `ethtool -S`.
+
+        The output is parsed as bytes, names of the statistics are decoded
+        only the first time they are seen and then shared across scrapes
+        and interfaces. Values are split off at the last ": ", some drivers
+        (e.g. bnxt) use it in names of per-queue statistics.
+
+        :param interface: Interface the output belongs to.
+        :param data: Output of ethtool.
+        :return: Pairs of statistic name and value.
+        """
+        keys = self._stats_keys
+        for line in data.splitlines():
+            raw_key, separator, value = line.rpartition(b": ")
+            if not separator:
+                # drop empty lines and the header
+                if (line := line.strip()) and line != b"NIC statistics:":
+                    self.logger.debug(
+                        f"Failed to parse key and value from line: {line}"
+                    )
+                continue
+            if (key := keys.get(raw_key)) is None:
+                key = keys[raw_key] = intern(
+                    raw_key.strip().decode("utf-8", errors="replace")
+                )
+            try:
+                yield key, float(value)
+            except ValueError:
+                self.metrics.parse_failure(interface)
+                self.logger.warning(
+                    f'Failed parsing "{line.strip().decode(errors="replace")}"'
+                )
+
+    def queue_key(self, key: str) -> Optional[tuple[str, str]]:
+        """Split name of a per-queue statistic to the queue and the type.
+
+        Results are memoized, so rules are matched once per key.
+
+        :param key: Name of the statistic.
+        :return: Queue number and name of the statistic without it, None
+        if it's not a per-queue statistic.
+        """
+        try:
+            return self._queue_keys[key]
+        except KeyError:
+            pass
+        queue_key = None
+        for rule in self.queue_rules:
+            if match := rule.search(key):
+                if "type" in rule.groupindex:
+                    base = match.group("type")
+                else:
+                    start, end = match.span("queue")
+                    base = re.sub("__+", "_", key[:start] + key[end:]).strip("_")
+                queue_key = (match.group("queue"), intern(base))
+                break
+        self._queue_keys[key] = queue_key
+        return queue_key
+
+    def _add_stats(
+        self,
+        interface: str,
+        keys: tuple[str, ...],
+        values: Sequence[float],
+        families: MetricFamilies,
+    ):
+        """Add filtered statistics of interface to gauges.
+
+        :param interface: Interface the statistics belong to.
+        :param keys: Names of the statistics.
+        :param values: Values of the statistics.
+        :param families: Destination metrics to put the data in.
+        """
+        layout = self._stats_layouts.get(interface)
+        if layout is None or layout.keys != keys:
+            layout = self._stats_layouts[interface] = self._stats_layout(
+                interface, keys
+            )
+        if layout.duplicates:
+            self.metrics.duplicate_key(interface, layout.duplicates)
+        for name, store in layout.stores.items():
+            families[name].add_store(interface, store, store.update(values))
+
+    def _stats_layout(self, interface: str, keys: tuple[str, ...]) -> StatsLayout:
+        """Lay out series made from statistics with the given names.
+
+        Filters and queue rules are applied here, once for every list of
+        statistics an interface reports.
 
-        :param interface: Interface we make metrics from.
-        :param gauge: Destination metric to put the data in.
+        :param interface: Interface the statistics belong to.
+        :param keys: Names of the statistics.
+        :return: Stores of the series keyed by their family.
         """
-        if not (data := self.run_ethtool(interface, "-S")):
-            return
+        layout = StatsLayout(keys, {})
+        queue_mode = self.args.queue_stats
+        stats: dict[str, list] = {"stats": [], "stats.queue": []}
+        queues: dict[str, list[int]] = {}
         key_set = set()
-        for line in data.decode("utf-8").splitlines():
-            line = line.strip()
-            # drop empty lines and the header
-            if not line or line == "NIC statistics:":
-                continue
-            try:
-                if not (key_val := self._parse_key_value_line(line)):
-                    continue
-
-                key, value = key_val
-                key = key.strip()
-                value = float(value.strip())
-            except ValueError:
-                self.logger.warning(f'Failed parsing "{line}"')
-                continue
-
+        for index, key in enumerate(keys):
             if not self.whitelist_blacklist_check(key):
                 continue
 
-            if key not in key_set:
-                gauge.add_metric([interface, key], value)
-                key_set.add(key)
-
-            else:
+            if key in key_set:
+                layout.duplicates += 1
                 self.logger.warning(
                     f"Item {key} already seen, check the source data for "
                     f"interface {interface}"
                 )
+                continue
+            key_set.add(key)
+
+            if queue_mode == "raw" or not (queue_key := self.queue_key(key)):
+                stats["stats"].append(((key,), (index,)))
+            elif queue_mode == "label":
+                stats["stats.queue"].append((queue_key, (index,)))
+            else:
+                queues.setdefault(queue_key[1], []).append(index)
+        for name, series in stats.items():
+            if series:
+                labels, sources = zip(*series)
+                layout.stores[name] = SeriesStore(labels, sources)
+        if queues:
+            labels = [(base,) for base in queues]
+            sources = [tuple(indices) for indices in queues.values()]
+            layout.stores["stats.queue_sum"] = SeriesStore(labels, sources, sum)
+            if self.args.queue_max:
+                layout.stores["stats.queue_max"] = SeriesStore(labels, sources, max)
+        return layout
 
-    def update_basic_info(self, interface: str, info: InfoMetricFamily):
+    def update_basic_info(
+        self,
+        interface: str,
+        info: InfoMetricFamily,
+        settings: Optional[dict[str, str]] = None,
+    ) -> bool:
         """Update metric with info from ethtool for interface interface.
 
         :param interface: Interface we make metrics from.
         :param info: Destination metric to put the data in.
+        :param settings: Link settings already read using netlink. When
+        missing, ethtool is run to get them.
+        :return: False if the port can't have a transceiver, True otherwise.
         """
-        if not (data := self.run_ethtool(interface, "")):
-            return
-
-        self.ports_without_sfp = []
+        key = (interface, "info")
+        if not self.breaker.allow(key):
+            self.logger.debug(f"Skipping information of {interface}, breaker open")
+            return True
+        if settings is None:
+            if not (data := self.run_ethtool(interface, "", gated=True)):
+                return True
+            settings = self._parse_basic_info(data)
+        else:
+            self.breaker.success(key)
 
+        has_sfp = True
         labels = {"device": interface}
+        for key, value in settings.items():
+            # special handling for special values
+            if (key == "port") and (value == "Other" or value == "None"):
+                has_sfp = False
+                continue
+            if not self.key_allowed("info", key):
+                continue
+            try:
+                if key == "speed":
+                    value = self._decode_speed_value(value)
+            except ValueError:
+                self.metrics.parse_failure(interface)
+                self.logger.warning(
+                    f'Failed to parse speed "{value}" of interface {interface}'
+                )
+                continue
+            labels[key] = value
+        info.add_metric(labels.values(), labels)
+        return has_sfp
+
+    def _parse_basic_info(self, data: bytes) -> dict[str, str]:
+        """Parse the output of plain `ethtool`.
+
+        :param data: Output of ethtool.
+        :return: Whitelisted link settings.
+        """
+        settings = {}
         for line in data.decode("utf-8").splitlines():
             line = line.strip()
             # drop empty lines
@@ -315,20 +2478,9 @@ class EthtoolCollector:
                 continue
             key, value = key_val
             key = key.strip().replace(" ", "_").lower()
-            if key not in self.basic_info_whitelist:
-                continue
-            # special handling for special values
-            if (key == "port") and (value == "Other" or value == "None"):
-                self.ports_without_sfp.append(interface)
-                continue
-            try:
-                if key == "speed":
-                    value = self._decode_speed_value(value)
-            except ValueError:
-                self.logger.warning(f'Failed to parse speed in: "{line}"')
-                continue
-            labels[key] = value
-        info.add_metric(labels.values(), labels)
+            if key in self.basic_info_whitelist:
+                settings[key] = value
+        return settings
 
     def _parse_key_value_line(self, line) -> Optional[list[str, str]]:
         """Parse key: value from line if possible.
@@ -356,24 +2508,16 @@ class EthtoolCollector:
             return "0"
         return speed
 
-    def add_split(
-        self,
-        sensors: GaugeMetricFamily,
-        interface: str,
-        metric_name: str,
-        metric_value: str,
-    ):
+    def split_value(self, metric_name: str, metric_value: str) -> tuple[str, float]:
         """Helper method to split values like '10.094 mA'
 
-        :param sensors: Destination metric to put the sensors data in.
-        :param interface: Interface we make metrics from.
         :param metric_name: Name of the statistic we will parse to metric.
         :param metric_value: Value of the statistic we will parse to metric.
+        :return: Name of the metric including the unit and the value.
         """
         val, unit = metric_value.split(" ", 1)
         unit = self._remove_separators(unit)
-        labels = [interface, f"{metric_name}_{unit}"]
-        sensors.add_metric(labels=labels, value=float(val))
+        return f"{metric_name}_{unit}", float(val)
 
     @staticmethod
     def _remove_separators(value: str) -> str:
@@ -390,23 +2534,55 @@ class EthtoolCollector:
         info: InfoMetricFamily,
         sensors: GaugeMetricFamily,
         alarms: GaugeMetricFamily,
+        collectors: frozenset[str],
     ):
         """Update transceiver metrics with info from ethtool.
 
+        Reading the module EEPROM is slow, so the data is cached. Sensors and
+        alarms are re-read every --xcvr-sensors-interval seconds, which is
+        the only thing saving EEPROM reads. Static information and thresholds
+        are only parsed again when a module with a different serial number
+        is plugged in.
+
         :param interface: Interface we make metrics from.
         :param info: Destination metric to put the info data in.
         :param sensors: Destination metric to put the sensors data in.
         :param alarms: Destination metric to put the alarms data in.
+        :param collectors: Collectors to update the metrics of.
         """
-
-        if interface in self.ports_without_sfp:
+        now = monotonic()
+        cached = self.xcvr_cache.get(interface)
+        if cached and now - cached.sensors_read < self.args.xcvr_sensors_interval:
+            self._add_xcvr_data(interface, cached, info, sensors, alarms, collectors)
             return
         if not (data := self.run_ethtool(interface, "-m")):
             # This usually happens when transceiver is missing
             self.logger.info(f"Cannot get transceiver data for {interface}")
+            self.xcvr_cache.pop(interface, None)
             return
 
-        info_labels = {"device": interface}
+        # Modules without a serial number can't be told apart
+        with_info = cached is None or not cached.info.get("vendor_sn")
+        xcvr = self._parse_xcvr_data(data, with_info)
+        if not with_info:
+            if xcvr.info.get("vendor_sn") == cached.info["vendor_sn"]:
+                xcvr.info = cached.info
+            else:
+                self.logger.debug(f"Transceiver of {interface} has changed")
+                xcvr = self._parse_xcvr_data(data, True)
+        xcvr.sensors_read = now
+        self.xcvr_cache[interface] = xcvr
+        self._add_xcvr_data(interface, xcvr, info, sensors, alarms, collectors)
+
+    def _parse_xcvr_data(self, data: bytes, with_info: bool) -> TransceiverData:
+        """Parse the output of `ethtool -m`.
+
+        :param data: Output of ethtool.
+        :param with_info: Whether to parse static information and thresholds.
+        Without it only the serial number is kept to detect module changes.
+        :return: Parsed transceiver data.
+        """
+        xcvr = TransceiverData()
         for line in data.decode("utf-8").splitlines():
             line = line.strip()
             # drop empty lines
@@ -424,11 +2600,12 @@ class EthtoolCollector:
             value = value.strip()
 
             if key in self.xcvr_info_whitelist:
-                info_labels[key] = value
+                if with_info or key == "vendor_sn":
+                    xcvr.info[key] = value
 
             elif key in self.xcvr_sensors_whitelist:
                 if key in ("module_voltage", "laser_bias_current"):
-                    self.add_split(sensors, interface, key, value)
+                    xcvr.sensors.append(self.split_value(key, value))
 
                 elif key in (
                     "laser_output_power",
@@ -436,86 +2613,848 @@ class EthtoolCollector:
                     "module_temperature",
                 ):
                     for val in value.split(" / "):
-                        self.add_split(sensors, interface, key, val)
+                        xcvr.sensors.append(self.split_value(key, val))
 
             elif key in self.xcvr_alarms_whitelist:
                 if value == "Off":
                     continue
+                xcvr.alarms.append((key, value))
+        return xcvr
+
+    def _add_xcvr_data(
+        self,
+        interface: str,
+        xcvr: TransceiverData,
+        info: InfoMetricFamily,
+        sensors: GaugeMetricFamily,
+        alarms: GaugeMetricFamily,
+        collectors: frozenset[str],
+    ):
+        """Add parsed transceiver data to metrics of enabled collectors.
+
+        :param interface: Interface the transceiver belongs to.
+        :param xcvr: Parsed transceiver data.
+        :param info: Destination metric to put the info data in.
+        :param sensors: Destination metric to put the sensors data in.
+        :param alarms: Destination metric to put the alarms data in.
+        :param collectors: Collectors to add the data for.
+        """
+        if "xcvr_sensors" in collectors:
+            for key, value in xcvr.sensors:
+                if self.key_allowed("xcvr_sensors", key):
+                    sensors.add_metric(labels=[interface, key], value=value)
+        if "xcvr_alarms" in collectors:
+            for key, value in xcvr.alarms:
+                if not self.key_allowed("xcvr_alarms", key):
+                    continue
                 labels = {
                     "device": interface,
                     "type": key,
                     "value": value,
                 }
                 alarms.add_metric(labels=labels.values(), value=1.0)
-        info.add_metric(info_labels.values(), info_labels)
+        if "xcvr_info" in collectors:
+            info_labels = {"device": interface}
+            for key, value in xcvr.info.items():
+                if self.key_allowed("xcvr_info", key):
+                    info_labels[key] = value
+            info.add_metric(info_labels.values(), info_labels)
+
+    @staticmethod
+    def _new_metric_families() -> MetricFamilies:
+        """Create empty metric families exported by the collector.
+
+        :return: Metric families in the order they are exported.
+        """
+        return {
+            "info": InfoMetricFamily(
+                "node_net_ethtool", "Ethtool device information", labels=["device"]
+            ),
+            "xcvr_info": InfoMetricFamily(
+                "node_net_ethtool_xcvr",
+                "Ethtool device transceiver information",
+                labels=["device"],
+            ),
+            "xcvr_sensors": GaugeMetricFamily(
+                "node_net_ethtool_xcvr_sensors",
+                "Ethtool transceiver sensors",
+                labels=["device", "type"],
+            ),
+            "xcvr_alarms": GaugeMetricFamily(
+                "node_net_ethtool_xcvr_alarms",
+                "Ethtool transceiver sensor alarms",
+                labels=["device", "type"],
+            ),
+            "stats": StoredFamily(
+                "node_net_ethtool", "Ethtool data", labels=["device", "type"]
+            ),
+            "stats.queue": StoredFamily(
+                "node_net_ethtool_queue",
+                "Ethtool per-queue data",
+                labels=["device", "queue", "type"],
+            ),
+            "stats.queue_sum": StoredFamily(
+                "node_net_ethtool_queue_sum",
+                "Ethtool per-queue data summed over all queues",
+                labels=["device", "type"],
+            ),
+            "stats.queue_max": StoredFamily(
+                "node_net_ethtool_queue_max",
+                "Highest value of ethtool per-queue data among all queues",
+                labels=["device", "type"],
+            ),
+            "vf.info": InfoMetricFamily(
+                "node_net_ethtool_vf",
+                "SR-IOV virtual function configuration",
+                labels=["device", "vf"],
+            ),
+            "vf": GaugeMetricFamily(
+                "node_net_ethtool_vf",
+                "SR-IOV virtual function statistics",
+                labels=["device", "vf", "type"],
+            ),
+        }
+
+    def update_vfs(self, interfaces: list[str], families: MetricFamilies):
+        """Update metrics with virtual functions of physical interfaces.
+
+        :param interfaces: Physical interfaces to read the VFs of.
+        :param families: Destination metrics to put the data in.
+        """
+        try:
+            vfs = find_vfs(self.vf_netlink)
+        except OSError as e:
+            self.logger.error(f"Reading virtual functions using netlink failed: {e}")
+            return
+        for interface in interfaces:
+            for vf_data in vfs.get(interface, ()):
+                vf = str(vf_data.vf)
+                info = {
+                    key: value
+                    for key, value in vf_data.info.items()
+                    if self.key_allowed("vf", key)
+                }
+                families["vf.info"].add_metric([interface, vf], info)
+                for key, value in vf_data.stats:
+                    if self.key_allowed("vf", key):
+                        families["vf"].add_metric([interface, vf, key], value)
+
+    def _family_enabled(self, name: str, collectors: frozenset[str]) -> bool:
+        """Check whether a metric family is exported.
+
+        :param name: Key of the family in _new_metric_families.
+        :param collectors: Collectors being collected.
+        :return: Bool if the family is exported.
+        """
+        collector, _, family = name.partition(".")
+        if collector not in collectors:
+            return False
+        if family == "queue":
+            return self.args.queue_stats == "label"
+        if family == "queue_sum":
+            return self.args.queue_stats == "sum"
+        if family == "queue_max":
+            return self.args.queue_stats == "sum" and self.args.queue_max
+        return True
+
+    def collect_interface_stats(self, interface: str) -> MetricFamilies:
+        """Collect statistics of a single interface.
+
+        :param interface: Interface we make metrics from.
+        :return: Metric families holding data of the interface only.
+        """
+        families = self._new_metric_families()
+        self.update_ethtool_stats(interface, families)
+        return families
+
+    def collect_interface_info(
+        self,
+        interface: str,
+        settings: Optional[dict[str, str]] = None,
+        collectors: Optional[frozenset[str]] = None,
+    ) -> MetricFamilies:
+        """Collect basic and transceiver information of a single interface.
+
+        Transceiver data is only read when basic information doesn't rule
+        out presence of a transceiver, so these two can't run in parallel.
+
+        :param interface: Interface we make metrics from.
+        :param settings: Link settings of the interface read using netlink.
+        :param collectors: Collectors to collect, all enabled ones when None.
+        :return: Metric families holding data of the interface only.
+        """
+        if collectors is None:
+            collectors = self.collectors
+        families = self._new_metric_families()
+        if "info" in collectors:
+            has_sfp = self.update_basic_info(interface, families["info"], settings)
+        else:
+            # Without basic information we only know what netlink told us
+            has_sfp = (settings or {}).get("port") not in ("Other", "None")
+        if has_sfp and collectors & XCVR_COLLECTORS:
+            self.update_xcvr_info(
+                interface,
+                families["xcvr_info"],
+                families["xcvr_sensors"],
+                families["xcvr_alarms"],
+                collectors,
+            )
+        return families
 
-    def collect(self) -> Iterator[Union[InfoMetricFamily, GaugeMetricFamily]]:
+    def collect(
+        self,
+        collectors: Optional[frozenset[str]] = None,
+        devices: Optional[frozenset[str]] = None,
+    ) -> Iterator[Union[InfoMetricFamily, GaugeMetricFamily]]:
         """
         Collect the metrics.
 
         Collect the metrics and yield them. Prometheus client library
         uses this method to respond to http queries or save them to disk.
+        Interfaces are processed concurrently, but the results are merged
+        in the order of interfaces, so the output is deterministic.
+
+        :param collectors: Collectors to collect, all enabled ones when None.
+        Collectors which are not enabled are ignored.
+        :param devices: Interfaces to collect, all physical ones when None.
         """
-        gauge = GaugeMetricFamily(
-            "node_net_ethtool", "Ethtool data", labels=["device", "type"]
+        if self.args.netns == "own" or self.netns:
+            yield from self.collect_namespace(collectors, devices)
+            return
+        workers = self._netns_workers()
+        futures = [
+            (worker.name, worker.collect(collectors, devices)) for worker in workers
+        ]
+        results = [("", list(self.collect_namespace(collectors, devices)))]
+        for name, future in futures:
+            try:
+                results.append((name, future.result()))
+            except Exception:
+                self.logger.exception(f"Collection in network namespace {name} failed")
+        # Info and data families of the same collector share the name
+        merged: dict[tuple[str, str], MetricFamily] = {}
+        for name, families in results:
+            for family in families:
+                key = (family.name, family.type)
+                if (target := merged.get(key)) is None:
+                    target = merged[key] = Metric(
+                        family.name, family.documentation, family.type, family.unit
+                    )
+                target.samples.extend(
+                    sample._replace(labels={**sample.labels, "netns": name})
+                    for sample in family.samples
+                )
+        yield from merged.values()
+
+    def collect_namespace(
+        self,
+        collectors: Optional[frozenset[str]] = None,
+        devices: Optional[frozenset[str]] = None,
+    ) -> Iterator[Union[InfoMetricFamily, GaugeMetricFamily]]:
+        """Collect the metrics of interfaces in the current network namespace.
+
+        :param collectors: Collectors to collect, all enabled ones when None.
+        :param devices: Interfaces to collect, all physical ones when None.
+        """
+        started = monotonic()
+        collectors = self.collectors & (collectors or self.collectors)
+        interfaces = self.find_physical_interfaces()
+        if devices is not None:
+            interfaces = [interface for interface in interfaces if interface in devices]
+        with self._collect_lock:
+            families = self._collect_interfaces(interfaces, collectors)
+        series = {
+            name: (
+                len(family) if isinstance(family, StoredFamily) else len(family.samples)
+            )
+            for name, family in families.items()
+            if self._family_enabled(name, collectors)
+        }
+        duration = monotonic() - started
+        for name in series:
+            yield families[name]
+        if self.sampler and "stats" in collectors:
+            yield from self.sampler.collect(devices)
+        if self.link_tracker and "link" in collectors:
+            yield from self.link_tracker.collect(interfaces)
+        yield from self.metrics.collect(duration, series)
+        yield from self.breaker.collect()
+
+    def _collect_interfaces(
+        self, interfaces: list[str], collectors: frozenset[str]
+    ) -> MetricFamilies:
+        """Collect data of the interfaces using the thread pool.
+
+        Callers hold the collection lock, as reads of an interface share
+        buffers and caches with other collections of the same interface.
+
+        :param interfaces: Interfaces to collect.
+        :param collectors: Collectors to collect.
+        :return: Metric families holding data of all the interfaces.
+        """
+        started = monotonic()
+        families = self._new_metric_families()
+        with_stats = "stats" in collectors
+        with_info = bool(collectors - {"stats", "vf", "link"})
+        link_settings = {}
+        if self.ethtool_netlink and with_info:
+            try:
+                link_settings = self.ethtool_netlink.link_settings()
+            except OSError as e:
+                self.logger.error(f"Reading link settings using netlink failed: {e}")
+        futures: dict[Future, tuple[str, str]] = {}
+        for interface in interfaces:
+            if with_stats:
+                future = self.executor.submit(self.collect_interface_stats, interface)
+                futures[future] = (interface, "stats")
+            if with_info:
+                future = self.executor.submit(
+                    self.collect_interface_info,
+                    interface,
+                    link_settings.get(interface),
+                    collectors,
+                )
+                futures[future] = (interface, "info")
+        if "vf" in collectors:
+            self.update_vfs(interfaces, families)
+        timeout = self.args.collection_timeout - (monotonic() - started)
+        _, late = wait(futures, timeout=max(0.0, timeout))
+        for future in late:
+            interface, name = futures[future]
+            if future.cancel():
+                # Waiting behind a stuck one, it's not to blame
+                self.logger.warning(
+                    f"Dropping {name} of interface {interface}, collection timed out"
+                )
+                continue
+            self.metrics.timeout(interface, name)
+            self.logger.error(
+                f"Collecting {name} of interface {interface} did not finish in "
+                f"{self.args.collection_timeout}s, dropping it"
+            )
+            self._command_failed((interface, name))
+        for future in futures:
+            if future in late:
+                continue
+            for name, family in future.result().items():
+                if isinstance(family, StoredFamily):
+                    families[name].stores.extend(family.stores)
+                else:
+                    families[name].samples.extend(family.samples)
+        return families
+
+    def _link_changed(
+        self,
+        msg_type: Optional[int],
+        index: int,
+        name: str,
+        flags: int,
+        attrs: dict[int, bytes],
+    ):
+        """Invalidate cached interfaces when an interface appears or goes away.
+
+        Link state changes of known interfaces keep the cache.
+
+        :param msg_type: RTM_NEWLINK, RTM_DELLINK or None if events were lost.
+        :param index: Index of the interface.
+        :param name: Name of the interface.
+        :param flags: Interface flags.
+        :param attrs: Other attributes of the notification.
+        """
+        if msg_type == RTM_NEWLINK and name in self._interface_names:
+            return
+        self._interfaces_generation += 1
+
+    def find_namespaces(self) -> dict[str, str]:
+        """Find network namespaces other than the exporter's own one.
+
+        Namespaces are deduplicated, named ones are preferred to those found
+        through processes, which are named after their inode.
+
+        :return: Paths to the namespaces keyed by their names.
+        """
+        paths = []
+        if self.args.netns in ("named", "all"):
+            netns_dir = Path("/run/netns")
+            if netns_dir.is_dir():
+                paths.extend((file.name, file) for file in sorted(netns_dir.iterdir()))
+        if self.args.netns in ("pids", "all"):
+            for process in Path("/proc").iterdir():
+                if process.name.isdigit():
+                    file = process / "ns/net"
+                    try:
+                        paths.append((file.readlink().name, file))
+                    except OSError:
+                        # The process has exited or is a kernel thread
+                        continue
+        seen = {stat("/proc/self/ns/net").st_ino}
+        namespaces = {}
+        for name, path in paths:
+            try:
+                inode = stat(path).st_ino
+            except OSError:
+                continue
+            if inode not in seen:
+                seen.add(inode)
+                namespaces[name] = str(path)
+        return namespaces
+
+    def _netns_workers(self) -> list["NetnsWorker"]:
+        """Start and stop workers as network namespaces appear and go away.
+
+        :return: Workers of all current namespaces.
+        """
+        namespaces = self.find_namespaces()
+        for name in set(self.netns_workers) - set(namespaces):
+            self.logger.debug(f"Network namespace {name} is gone")
+            self.netns_workers.pop(name).close()
+        for name, path in namespaces.items():
+            if name not in self.netns_workers:
+                try:
+                    self.netns_workers[name] = NetnsWorker(
+                        name, path, self.arguments, self.ethtool
+                    )
+                except OSError as e:
+                    self.logger.warning(str(e))
+        return [self.netns_workers[name] for name in sorted(self.netns_workers)]
+
+    def find_physical_interfaces(self) -> list[str]:
+        """Find physical interfaces and optionally filter them.
+
+        The result is cached for --interface-rescan-interval seconds or until
+        the link monitor sees an interface to be added, renamed or removed.
+        """
+        generation = self._interfaces_generation
+        if (
+            self.link_monitor
+            and self._interfaces is not None
+            and self._scanned_generation == generation
+            and monotonic() - self._interfaces_checked
+            < self.args.interface_rescan_interval
+        ):
+            return self._interfaces
+        checked = monotonic()
+        names = []
+        interfaces = []
+        if self.netns:
+            # sysfs shows interfaces of the namespace it was mounted in
+            names, physical = find_ethernet_links(self.route_netlink)
+            interfaces = [name for name in physical if self.interface_regex.match(name)]
+        else:
+            # https://serverfault.com/a/833577/393474
+            for file in Path(self.args.sysfs_root, "class/net").iterdir():
+                names.append(file.name)
+                if (
+                    self.interface_regex.match(file.name)
+                    and file.is_symlink()
+                    and "virtual" not in str(file.readlink())
+                ):
+                    interfaces.append(file.name)
+        self._interface_names = frozenset(names)
+        self._interfaces = sorted(interfaces)
+        self._scanned_generation = generation
+        self._interfaces_checked = checked
+        return self._interfaces
+
+
+class NetnsWorker:
+    """Collector running in a thread pinned to another network namespace.
+
+    setns() moves only the calling thread, so the pinned thread creates the
+    collector, whose sockets, worker threads and ethtool processes then all
+    stay in the namespace.
+    """
+
+    def __init__(self, name: str, path: str, arguments: list[str], ethtool: str):
+        """Enter the namespace and construct the collector in it.
+
+        :param name: Value of the netns label.
+        :param path: Path to the namespace.
+        :param arguments: Arguments of the exporter.
+        :param ethtool: Path to the ethtool executable.
+        :raises OSError: When the namespace can't be entered.
+        """
+        self.name = name
+        self.path = path
+        self.executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix=f"netns-{name}",
+            initializer=enter_netns,
+            initargs=(path,),
         )
-        basic_info = InfoMetricFamily(
-            "node_net_ethtool", "Ethtool device information", labels=["device"]
+        try:
+            self.collector = self.executor.submit(
+                EthtoolCollector, arguments, name
+            ).result()
+        except RuntimeError as e:
+            # BrokenThreadPool, the initializer failed
+            self.executor.shutdown(wait=False)
+            raise OSError(f"Cannot enter network namespace {path}: {e}")
+        self.collector.ethtool = ethtool
+
+    def collect(
+        self,
+        collectors: Optional[frozenset[str]] = None,
+        devices: Optional[frozenset[str]] = None,
+    ) -> Future:
+        """Start collecting metrics in the namespace.
+
+        :param collectors: Collectors to collect, all enabled ones when None.
+        :param devices: Interfaces to collect, all physical ones when None.
+        :return: Future with the list of collected metric families.
+        """
+        return self.executor.submit(
+            lambda: list(self.collector.collect(collectors, devices))
         )
-        xcvr_info = InfoMetricFamily(
-            "node_net_ethtool_xcvr",
-            "Ethtool device transceiver information",
-            labels=["device"],
+
+    def close(self):
+        """Stop the threads, so they don't keep the namespace alive."""
+        self.collector.executor.shutdown(wait=False)
+        self.executor.shutdown(wait=False)
+
+
+class Exposition:
+    """Metric families of one collection rendered for serving over HTTP.
+
+    Every format and encoding is rendered the first time a scraper asks for
+    it and reused by all later scrapes served from the same collection.
+    """
+
+    def __init__(self, taken: float, families: tuple[MetricFamily, ...]):
+        """Construct the object with nothing rendered yet.
+
+        :param taken: Monotonic time the families were collected.
+        :param families: Collected metric families.
+        """
+        self.taken = taken
+        self.families = families
+        self._lock = Lock()
+        # Rendered data keyed by (openmetrics, gzip)
+        self._rendered: dict[tuple[bool, bool], bytes] = {}
+
+    def rendered(self, openmetrics: bool, gzip: bool) -> bytes:
+        """Get the rendered families without the final line of OpenMetrics.
+
+        :param openmetrics: Whether to return OpenMetrics instead of text format.
+        :param gzip: Whether to return gzip compressed data.
+        :return: Rendered data.
+        """
+        key = (openmetrics, gzip)
+        if key not in self._rendered:
+            with self._lock:
+                if key not in self._rendered:
+                    data = self._rendered.get((openmetrics, False))
+                    if data is None:
+                        if openmetrics:
+                            data = generate_openmetrics(self.families)
+                            data = data.removesuffix(b"# EOF\n")
+                        else:
+                            data = generate_text(self.families)
+                        self._rendered[(openmetrics, False)] = data
+                    if gzip:
+                        self._rendered[key] = compress(data)
+        return self._rendered[key]
+
+
+class SnapshotCollector:
+    """Serve metrics of EthtoolCollector from an immutable snapshot.
+
+    Scrapes which arrive while a collection is running wait for that
+    collection instead of starting another one. With a background thread
+    running, scrapes are answered from the last snapshot right away.
+    Scrapes selecting collectors or devices always wait for a collection
+    of their scope.
+    """
+
+    def __init__(self, collector: EthtoolCollector, background: bool = False):
+        """Construct the object.
+
+        :param collector: Collector used to gather the data.
+        :param background: Whether snapshots are refreshed by run_forever.
+        """
+        self.collector = collector
+        self.background = background
+        self._lock = Lock()
+        # Collections running for every scope and their results
+        self._in_flight: dict[Scope, tuple[Event, list[Optional[Exposition]]]] = {}
+        self._snapshot: Optional[Exposition] = None
+
+    def refresh(self, scope: Scope = FULL_SCOPE) -> Optional[Exposition]:
+        """Collect a new snapshot or wait for the one already being collected.
+
+        :param scope: Collectors and devices to collect, None for all.
+        :return: Rendered snapshot, None if the collection we waited for failed.
+        """
+        with self._lock:
+            if leader := scope not in self._in_flight:
+                self._in_flight[scope] = (Event(), [None])
+            event, result = self._in_flight[scope]
+        if not leader:
+            event.wait()
+            if result[0] is None and scope == FULL_SCOPE:
+                return self._snapshot
+            return result[0]
+        try:
+            started = monotonic()
+            result[0] = Exposition(started, tuple(self.collector.collect(*scope)))
+            if scope == FULL_SCOPE:
+                self._snapshot = result[0]
+        finally:
+            with self._lock:
+                del self._in_flight[scope]
+            event.set()
+        return result[0]
+
+    def run_forever(self, interval: float):
+        """Refresh the snapshot every interval seconds.
+
+        :param interval: Number of seconds between starts of two collections.
+        """
+        while True:
+            started = monotonic()
+            try:
+                self.refresh()
+            except Exception:
+                self.collector.logger.exception("Background collection failed")
+            sleep(max(0.0, interval - (monotonic() - started)))
+
+    def snapshot(self, scope: Scope = FULL_SCOPE) -> Optional[Exposition]:
+        """Get the snapshot to serve, collecting it if needed.
+
+        :param scope: Collectors and devices to collect, None for all.
+        :return: Rendered snapshot, None if there is none to serve.
+        """
+        if scope != FULL_SCOPE:
+            return self.refresh(scope)
+        snapshot = self._snapshot
+        if not self.background or snapshot is None:
+            snapshot = self.refresh()
+        return snapshot
+
+    @staticmethod
+    def age(snapshot: Exposition, openmetrics: bool) -> bytes:
+        """Render age of the snapshot, which changes with every scrape.
+
+        :param snapshot: Served snapshot.
+        :param openmetrics: Whether to render OpenMetrics instead of text format.
+        :return: Rendered age metric, including the final line of OpenMetrics.
+        """
+        age = GaugeMetricFamily(
+            "ethtool_exporter_snapshot_age_seconds",
+            "Number of seconds since the served data was collected",
+            value=monotonic() - snapshot.taken,
         )
-        sensors = GaugeMetricFamily(
-            "node_net_ethtool_xcvr_sensors",
-            "Ethtool transceiver sensors",
-            labels=["device", "type"],
+        if openmetrics:
+            return generate_openmetrics((age,))
+        return generate_text((age,))
+
+
+class TextfileWriter:
+    """Update the textfile on a fixed grid of deadlines.
+
+    The grid is anchored to the wall clock once, shifted by a phase derived
+    from --phase-key, so hosts started by the same rollout spread their
+    updates over the interval. Deadlines then advance on the monotonic clock,
+    so the period doesn't grow by the duration of collections and isn't
+    affected by changes of the wall clock. When an update overruns its slot,
+    the ticks which have passed meanwhile are skipped instead of caught up.
+    """
+
+    def __init__(self, collector: EthtoolCollector, path: str, interval: float):
+        """Construct the object.
+
+        :param collector: Collector used to gather the data.
+        :param path: Path of the textfile.
+        :param interval: Number of seconds between two updates.
+        """
+        self.collector = collector
+        self.path = path
+        self.interval = interval
+        key = collector.args.phase_key
+        self.phase = crc32(key.encode()) / 2**32 * interval if key else 0.0
+        self.skipped = 0
+        self.overrun = 0.0
+        self._collected = 0.0
+        self._written: Optional[float] = None
+
+    def write(self):
+        """Collect data and replace the textfile with it."""
+        self._collected = time()
+        write_textfile(self.path, self._families())
+        self._written = monotonic()
+
+    def run_forever(self):
+        """Write the textfile right away and then at every tick of the grid."""
+        self.write()
+        deadline = monotonic() + (self.phase - time()) % self.interval
+        while True:
+            if (delay := deadline - monotonic()) > 0:
+                sleep(delay)
+            try:
+                self.write()
+            except Exception:
+                self.collector.logger.exception("Update of the textfile failed")
+            ended = monotonic()
+            if passed := int((ended - deadline) // self.interval):
+                self.overrun = ended - (deadline + self.interval)
+                self.skipped += passed
+                self.collector.logger.warning(
+                    f"Update of the textfile overran its slot by "
+                    f"{self.overrun:.3f}s, skipping {passed} ticks"
+                )
+            else:
+                self.overrun = 0.0
+            deadline += (passed + 1) * self.interval
+
+    def _families(self) -> Iterator[MetricFamily]:
+        """Yield collected metric families followed by those of the writer."""
+        yield from self.collector.collect()
+        yield GaugeMetricFamily(
+            "ethtool_exporter_textfile_timestamp_seconds",
+            "Unix time when the data in the textfile was collected",
+            value=self._collected,
         )
-        alarms = GaugeMetricFamily(
-            "node_net_ethtool_xcvr_alarms",
-            "Ethtool transceiver sensor alarms",
-            labels=["device", "type"],
+        age = GaugeMetricFamily(
+            "ethtool_exporter_textfile_age_seconds",
+            "Age of the previous textfile when it was replaced by this one",
+        )
+        if self._written is not None:
+            age.add_metric([], monotonic() - self._written)
+        yield age
+        yield GaugeMetricFamily(
+            "ethtool_exporter_textfile_overrun_seconds",
+            "Number of seconds the previous update overran its slot",
+            value=self.overrun,
+        )
+        yield CounterMetricFamily(
+            "ethtool_exporter_textfile_skipped_ticks",
+            "Number of updates skipped because an update overran its slot",
+            value=self.skipped,
         )
-        for interface in self.find_physical_interfaces():
-            self.update_ethtool_stats(interface, gauge)
-            self.update_basic_info(interface, basic_info)
-            self.update_xcvr_info(interface, xcvr_info, sensors, alarms)
-        yield basic_info
-        yield xcvr_info
-        yield sensors
-        yield alarms
-        yield gauge
 
-    def find_physical_interfaces(self) -> list[str]:
-        """Find physical interfaces and optionally filter them."""
-        # https://serverfault.com/a/833577/393474
-        return [
-            file.name
-            for file in Path("/sys/class/net").iterdir()
-            if (
-                file.is_symlink()
-                and "virtual" not in str(file.readlink().resolve())
-                and re.match(self.args.interface_regex, file.name)
-            )
-        ]
+
+class ExpositionHandler:
+    """Answer scrapes with pre-rendered snapshots of SnapshotCollector.
+
+    Mixed into BaseHTTPRequestHandler by create_http_server, so http.server
+    is only imported in HTTP mode.
+    """
+
+    server: "ExpositionServer"
+
+    def do_GET(self):
+        """Send the snapshot in the format and encoding the scraper accepts.
+
+        Collectors and devices can be selected by collect[] and device
+        query parameters, e.g. /metrics?collect[]=stats&device=eth0.
+        """
+        try:
+            scope = self._scope()
+        except ArgumentTypeError as e:
+            self.send_error(400, f"Invalid collect[] parameter: {e}")
+            return
+        try:
+            snapshot = self.server.snapshot.snapshot(scope)
+        except Exception:
+            self.server.snapshot.collector.logger.exception("Collection failed")
+            self.send_error(500, "Collection failed")
+            return
+        if snapshot is None:
+            self.send_error(503, "Collection failed")
+            return
+        openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+        gzip = "gzip" in self.headers.get("Accept-Encoding", "")
+        body = memoryview(snapshot.rendered(openmetrics, gzip))
+        age = SnapshotCollector.age(snapshot, openmetrics)
+        if gzip:
+            # Concatenated gzip members decompress to concatenated data
+            age = compress(age)
+        self.send_response(200)
+        self.send_header(
+            "Content-Type",
+            OPENMETRICS_CONTENT_TYPE if openmetrics else TEXT_CONTENT_TYPE,
+        )
+        if gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body) + len(age)))
+        self.end_headers()
+        # Unbuffered wfile sends the snapshot straight from its buffer
+        self.wfile.write(body)
+        self.wfile.write(age)
+
+    def _scope(self) -> Scope:
+        """Parse collectors and devices selected by the query.
+
+        :return: Selected collectors and devices, None for all.
+        :raises ArgumentTypeError: When an unknown collector is selected.
+        """
+        query = parse_qs(urlsplit(self.path).query)
+        collectors = None
+        if names := query.get("collect[]"):
+            collectors = frozenset(EthtoolCollector._parse_collectors(",".join(names)))
+        devices = None
+        if "device" in query:
+            devices = frozenset(query["device"])
+        return collectors, devices
+
+    def log_message(self, format: str, *args):
+        """Log requests at debug level instead of printing them to stderr."""
+        self.server.snapshot.collector.logger.debug(
+            f"{self.address_string()} {format % args}"
+        )
+
+
+class ExpositionServer:
+    """HTTP server answering scrapes in threads.
+
+    Mixed into ThreadingHTTPServer by create_http_server.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self, address: tuple[str, int], snapshot: SnapshotCollector, handler: type
+    ):
+        """Bind to the address.
+
+        :param address: IP address and port to listen on.
+        :param snapshot: Source of the served data.
+        :param handler: Request handler class.
+        """
+        self.address_family = getaddrinfo(*address)[0][0]
+        self.snapshot = snapshot
+        super().__init__(address, handler)
+
+
+def create_http_server(
+    address: tuple[str, int], snapshot: SnapshotCollector
+) -> ExpositionServer:
+    """Create the HTTP server, importing http.server only now.
+
+    :param address: IP address and port to listen on.
+    :param snapshot: Source of the served data.
+    :return: Bound server.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    handler = type("ExpositionHandler", (ExpositionHandler, BaseHTTPRequestHandler), {})
+    server = type("ExpositionServer", (ExpositionServer, ThreadingHTTPServer), {})
+    return server(address, snapshot, handler)
 
 
 if __name__ == "__main__":
     path = ":".join([environ.get("PATH", ""), "/usr/sbin", "/sbin"])
     # Try to find the executable of ethtool.
-    if (ethtool := find_executable("ethtool", path)) is None:
+    if (ethtool := which("ethtool", path=path)) is None:
         exit("Error: cannot find ethtool.")
     # Create new instance of EthtoolCollector.
     collector = EthtoolCollector()
     collector.ethtool = ethtool
     collector.logger.debug("Starting ethtool-collector")
-    # Create registry for metrics and assign collector.
-    registry = CollectorRegistry()
-    registry.register(collector)
 
     # If arguments passed for exposing metrics on port we use them.
     if collector.args.listen or collector.args.port:
+        snapshot = SnapshotCollector(collector, collector.args.background)
         if collector.args.listen:
             collector.logger.warning(
                 "You are using obsolete argument -l. Please switch to -L and -p"
@@ -528,16 +3467,20 @@ if __name__ == "__main__":
         ip = ip.replace("[", "").replace("]", "")
         collector.logger.debug(f"Serving metrics on {ip}:{port}")
         # Expose metrics on port and ip.
-        start_http_server(port, ip, registry=registry)
+        server = create_http_server((ip, int(port)), snapshot)
+        Thread(target=server.serve_forever, daemon=True).start()
+        if collector.args.background:
+            snapshot.run_forever(collector.args.interval)
         while True:
             sleep(collector.args.interval)
 
     # If arguments for serving to file are present we use them.
     if collector.args.textfile_name:
         collector.logger.debug(f"Putting metrics into {collector.args.textfile_name}")
-        while True:
-            collector.collect()
-            write_to_textfile(collector.args.textfile_name, registry)
-            if collector.args.oneshot:
-                exit(0)
-            sleep(collector.args.interval)
+        writer = TextfileWriter(
+            collector, collector.args.textfile_name, collector.args.interval
+        )
+        if collector.args.oneshot:
+            writer.write()
+            exit(0)
+        writer.run_forever()